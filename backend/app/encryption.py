@@ -0,0 +1,67 @@
+from cryptography.fernet import Fernet
+from dotenv import load_dotenv
+import os
+
+load_dotenv()
+
+# Encryption configuration
+ENCRYPTION_KEY = os.getenv("ENCRYPTION_KEY", Fernet.generate_key())
+
+cipher = Fernet(ENCRYPTION_KEY)
+
+
+# Functiion for encrypting and decrypting fields
+def encrypt_field(value: str) -> str:
+    return cipher.encrypt(value.encode()).decode()
+
+
+def decrypt_field(value: str) -> str:
+    return cipher.decrypt(value.encode()).decode()
+
+
+# Utility functions for encryption and decryption
+def encrypt_applicant_info_data(data: dict) -> dict:
+    """
+    Encrypt sensitive applicant fields before saving to the database.
+    """
+    sensitive_fields = [
+        "dob",
+        "phone",
+        "mobile",
+        "address",
+        "permanent_address",
+        "aadhaar_number",
+        "email",
+    ]
+    for field in sensitive_fields:
+        if field in data and data[field]:
+            # Ensure encrypting a string
+            data[field] = encrypt_field(str(data[field]))
+    return data
+
+
+def decrypt_applicant_info_data(data: dict) -> dict:
+    """
+    Decrypt sensitive applicant fields before returning to the client.
+    Also, convert fields like phone and mobile back to int.
+    """
+    sensitive_fields = [
+        "dob",
+        "phone",
+        "mobile",
+        "address",
+        "permanent_address",
+        "aadhaar_number",
+        "email",
+    ]
+    for field in sensitive_fields:
+        if field in data and data[field]:
+            decrypted = decrypt_field(data[field])
+            if field in ["phone", "mobile"]:
+                try:
+                    data[field] = str(decrypted)
+                except Exception:
+                    data[field] = decrypted
+            else:
+                data[field] = decrypted
+    return data
@@ -0,0 +1,27 @@
+"""
+Schema changes that create_all cannot make: it creates missing tables but
+never alters existing ones, so columns added to existing models are added
+here. Every step checks the live schema first and can run on each start.
+"""
+
+from sqlalchemy import inspect, text
+
+# (table, column, SQL type) of columns added to tables that may predate them
+ADDED_COLUMNS = [
+    # Encrypted OCR output, for NER-only re-runs
+    ("applicant_documents", "ocr_text", "VARCHAR"),
+]
+
+
+def add_missing_columns(engine):
+    """ALTER TABLE ... ADD COLUMN for each added column a table still lacks."""
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table, column, sql_type in ADDED_COLUMNS:
+            if not inspector.has_table(table):
+                continue
+            columns = {c["name"] for c in inspector.get_columns(table)}
+            if column not in columns:
+                connection.execute(
+                    text(f"ALTER TABLE {table} ADD COLUMN {column} {sql_type}")
+                )
@@ -122,6 +122,8 @@ class ApplicantDocuments(Base):
     file_name = Column(String, index=True)
     doc_type = Column(String, index=True)  # Classification type
     extracted_content = Column(JSON, nullable=False)
+    # Encrypted JSON of the OCR output ({"text", "lines"}) so NER can be re-run
+    ocr_text = Column(String, nullable=True)
 
     user = relationship("Users", back_populates="applicant_documents")
     is_reviewed = Column(Boolean, default=False)
@@ -173,3 +175,13 @@ class Submissions(Base):
 
     # Relationships
     user = relationship("Users", back_populates="submissions")
+
+
+class ExtractionCacheEntry(Base):
+    __tablename__ = "extraction_cache"
+
+    key = Column(String, primary_key=True)  # sha256 of file, doc_type, prompt, model
+    doc_type = Column(String, index=True)
+    entities = Column(JSON, nullable=False)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    last_used_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
@@ -0,0 +1,82 @@
+"""
+Re-running NER over stored OCR text, shared by the API and script.rerun_ner.
+Kept out of main so scripts can use it without building the app.
+"""
+
+import asyncio
+import json
+import logging
+from typing import List
+
+from sqlalchemy.orm import Session
+
+from app.encryption import decrypt_field, encrypt_applicant_info_data
+from app.models import ApplicantDocuments
+from post_processing.post_processing import process_extracted_data
+from ocr_ner.data_extractor import incomplete_fields, rerun_ner, rerun_ner_async
+
+logger = logging.getLogger(__name__)
+
+
+def rerun_document_ner(document: ApplicantDocuments, db: Session) -> dict:
+    """
+    Re-run NER and post-processing over a document's stored OCR text and
+    replace its extracted data. The document goes back to the review queue.
+    """
+    if not document.ocr_text:
+        raise ValueError(f"Document {document.id} has no stored OCR text")
+
+    ocr = json.loads(decrypt_field(document.ocr_text))
+    extracted_data = rerun_ner(ocr["text"], document.doc_type, ocr.get("lines"))
+    return save_rerun_result(document, extracted_data, db)
+
+
+async def rerun_documents_ner(documents: List[ApplicantDocuments], db: Session):
+    """
+    Re-run NER for many documents with overlapping LLM calls, saving each
+    result as it completes. Returns the number of documents updated and failed.
+    """
+
+    async def rerun(document):
+        ocr = json.loads(await asyncio.to_thread(decrypt_field, document.ocr_text))
+        return document, await rerun_ner_async(
+            ocr["text"], document.doc_type, ocr.get("lines")
+        )
+
+    done, failed = 0, 0
+    for completed in asyncio.as_completed([rerun(doc) for doc in documents]):
+        try:
+            document, extracted_data = await completed
+            # Post-processing, encryption and the commit block; off the loop
+            await asyncio.to_thread(save_rerun_result, document, extracted_data, db)
+            done += 1
+        except Exception as e:
+            logger.error(f"Error re-running NER: {str(e)}")
+            failed += 1
+    return done, failed
+
+
+def save_rerun_result(document: ApplicantDocuments, extracted_data: dict, db: Session):
+    if "error" in extracted_data:
+        raise ValueError(
+            f"NER failed for document {document.id}: {extracted_data['error']}"
+        )
+
+    processed_data = process_extracted_data(extracted_data, document.doc_type)
+    content = dict(document.extracted_content)
+    content["data"] = encrypt_applicant_info_data(processed_data)
+    set_incomplete_fields(content, incomplete_fields(extracted_data, document.doc_type))
+
+    document.extracted_content = content
+    document.is_reviewed = False
+    db.commit()
+    db.refresh(document)
+    logger.info(f"Re-ran NER for document {document.id} ({document.doc_type})")
+    return processed_data
+
+
+def set_incomplete_fields(content: dict, fields: dict):
+    if fields:
+        content["incomplete_fields"] = fields
+    else:
+        content.pop("incomplete_fields", None)
@@ -1,7 +1,7 @@
 import os
+import asyncio
 import aiohttp
 import json
-import requests
 import boto3
 import uuid
 import mimetypes
@@ -9,7 +9,6 @@ import random
 import string
 import logging
 from datetime import timedelta, datetime
-from io import BytesIO
 from dotenv import load_dotenv
 from logging.handlers import RotatingFileHandler
 from typing import Annotated, Union, List, Optional
@@ -30,8 +29,20 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import joinedload, Session
 from sqlalchemy import distinct
-from cryptography.fernet import Fernet
-from app.database import engine, get_db
+from app.database import engine, get_db, SessionLocal
+from app.migrations import add_missing_columns
+from app.encryption import (
+    cipher,
+    encrypt_field,
+    decrypt_field,
+    encrypt_applicant_info_data,
+    decrypt_applicant_info_data,
+)
+from app.ner_rerun import (
+    rerun_document_ner,
+    rerun_documents_ner,
+    set_incomplete_fields,
+)
 from app import models
 from app.models import (
     Admin,
@@ -43,6 +54,7 @@ from app.models import (
     ApplicantDocuments,
     Submissions,
     ReviewUser,
+    ExtractionCacheEntry,
 )
 from app.routers.auth import (
     create_access_token,
@@ -71,7 +83,16 @@ from app.schemas import (
     ApplicantPartialUpdate,
 )
 from post_processing.post_processing import process_extracted_data
-from ocr_ner.data_extractor import extract_data as data_extractor
+from ocr_ner.data_extractor import extract_document_async
+from ocr_ner.data_extractor import warm_up as warm_up_pipeline, pipeline_status
+from ocr_ner.data_extractor import pipeline_timings
+from ocr_ner.data_extractor import check_upload, max_document_bytes
+from ocr_ner.data_extractor import extract_fields
+from ocr_ner.data_extractor import shutdown as shutdown_pipeline
+from ocr_ner.data_extractor import configure_cache as configure_extraction_cache
+from ocr_ner.src.result_cache import DatabaseCacheBackend
+from ocr_ner.src import timing
+from ocr_ner.src.image_guard import ImageRejected
 
 models.Base.metadata.create_all(bind=engine)
 
@@ -88,11 +109,6 @@ s3_client = boto3.client(
     region_name=S3_REGION,
 )
 
-# Encryption configuration
-ENCRYPTION_KEY = os.getenv("ENCRYPTION_KEY", Fernet.generate_key())
-
-cipher = Fernet(ENCRYPTION_KEY)
-
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -112,6 +128,8 @@ load_dotenv()
 
 app = FastAPI()
 models.Base.metadata.create_all(bind=engine)
+# create_all leaves existing tables as they are
+add_missing_columns(engine)
 
 app.add_middleware(
     CORSMiddleware,
@@ -132,61 +150,34 @@ app.mount("/js", StaticFiles(directory="../frontend/js"), name="js")
 db_dependency = Annotated[Session, Depends(get_db)]
 
 
-# Functiion for encrypting and decrypting fields
-def encrypt_field(value: str) -> str:
-    return cipher.encrypt(value.encode()).decode()
+@app.on_event("startup")
+async def load_extraction_pipeline():
+    """Load and warm the OCR/NER pipeline before serving the first applicant."""
+    try:
+        await asyncio.to_thread(warm_up_pipeline)
+        configure_extraction_cache(
+            db_backend=DatabaseCacheBackend(SessionLocal, ExtractionCacheEntry),
+            cipher=cipher,
+        )
+    except Exception as e:
+        logger.error(f"Failed to load extraction pipeline: {str(e)}", exc_info=True)
 
 
-def decrypt_field(value: str) -> str:
-    return cipher.decrypt(value.encode()).decode()
+@app.on_event("shutdown")
+def stop_extraction_pipeline():
+    shutdown_pipeline()
 
 
-# Utility functions for encryption and decryption
-def encrypt_applicant_info_data(data: dict) -> dict:
-    """
-    Encrypt sensitive applicant fields before saving to the database.
-    """
-    sensitive_fields = [
-        "dob",
-        "phone",
-        "mobile",
-        "address",
-        "permanent_address",
-        "aadhaar_number",
-        "email",
-    ]
-    for field in sensitive_fields:
-        if field in data and data[field]:
-            # Ensure encrypting a string
-            data[field] = encrypt_field(str(data[field]))
-    return data
+@app.get("/pipeline/status")
+async def get_pipeline_status():
+    """Load time and warm/cold status of the extraction pipeline."""
+    return pipeline_status()
 
 
-def decrypt_applicant_info_data(data: dict) -> dict:
-    """
-    Decrypt sensitive applicant fields before returning to the client.
-    Also, convert fields like phone and mobile back to int.
-    """
-    sensitive_fields = [
-        "dob",
-        "phone",
-        "mobile",
-        "address",
-        "permanent_address",
-        "aadhaar_number",
-        "email",
-    ]
-    for field in sensitive_fields:
-        if field in data and data[field]:
-            decrypted = decrypt_field(data[field])
-            if field in ["phone", "mobile"]:
-                try:
-                    data[field] = str(decrypted)
-                except Exception:
-                    data[field] = decrypted
-            else:
-                data[field] = decrypted
-    return data
+@app.get("/pipeline/timings")
+async def get_pipeline_timings():
+    """p50/p95 latency of each extraction stage, by doc_type."""
+    return pipeline_timings()
 
 
 # Function to authenticate admin
@@ -447,12 +438,34 @@ async def create_user(
         username = f"{phone_no}_{uuid.uuid4()}"
         submission_id = f"{phone_no}_{generate_random_string()}"  # Unique identifier for this submission
 
+        # Refuse oversized, malformed or bomb files before anything is uploaded
+        uploads = {
+            "aadhaar": aadhaar_document,
+            "caste": caste_document,
+            "school_cert": school_cert_document,
+            "school_mark": school_mark_document,
+            "uni_cert": uni_cert_document,
+            "uni_mark": uni_mark_document,
+            "passport": passport_photo,
+            "signature": signature_photo,
+        }
+        for label, file in uploads.items():
+            if file:
+                try:
+                    # May load the pipeline on first use, and reads the file
+                    await asyncio.to_thread(check_upload, file.file)
+                except ImageRejected as e:
+                    raise CustomException(
+                        message=f"Invalid {label} file: {str(e)}",
+                        status_code=status.HTTP_400_BAD_REQUEST,
+                    )
+
         # Upload each document if provided – using the same pattern as for passport_photo/signature_photo.
         async def upload_file(file: Optional[UploadFile], label: str) -> str:
             if file:
-                content = await file.read()
                 file_key = f"{username}/{uuid.uuid4()}-{file.filename}"
-                s3_client.upload_fileobj(BytesIO(content), S3_BUCKET_NAME, file_key)
+                # Streamed from the spooled upload file, not read into memory
+                s3_client.upload_fileobj(file.file, S3_BUCKET_NAME, file_key)
                 return (
                     f"https://{S3_BUCKET_NAME}.s3.{S3_REGION}.amazonaws.com/{file_key}"
                 )
@@ -837,25 +850,31 @@ async def update_user_photos(
 
     username = db_user.username  # Keep the same folder structure in S3
 
+    # Refuse oversized, malformed or bomb images before anything is uploaded
+    for photo in (passport_photo, signature_photo):
+        if photo:
+            try:
+                await asyncio.to_thread(check_upload, photo.file)
+            except ImageRejected as e:
+                raise HTTPException(status_code=400, detail=str(e))
+
     try:
-        # Upload new passport photo if provided
+        # Upload new passport photo if provided, streamed from the upload file
         if passport_photo:
-            passport_photo_content = await passport_photo.read()
             passport_photo_key = f"{username}/{uuid.uuid4()}-{passport_photo.filename}"
             s3_client.upload_fileobj(
-                BytesIO(passport_photo_content), S3_BUCKET_NAME, passport_photo_key
+                passport_photo.file, S3_BUCKET_NAME, passport_photo_key
             )
             passport_photo_url = f"https://{S3_BUCKET_NAME}.s3.{S3_REGION}.amazonaws.com/{passport_photo_key}"
             db_user.passport_photo = passport_photo_url  # Update in DB
 
         # Upload new signature photo if provided
         if signature_photo:
-            signature_photo_content = await signature_photo.read()
             signature_photo_key = (
                 f"{username}/{uuid.uuid4()}-{signature_photo.filename}"
             )
             s3_client.upload_fileobj(
-                BytesIO(signature_photo_content), S3_BUCKET_NAME, signature_photo_key
+                signature_photo.file, S3_BUCKET_NAME, signature_photo_key
             )
             signature_photo_url = f"https://{S3_BUCKET_NAME}.s3.{S3_REGION}.amazonaws.com/{signature_photo_key}"
             db_user.signature_photo = signature_photo_url  # Update in DB
@@ -1167,110 +1186,304 @@ def process_applicant_info(user_id: int, db: Session):
         raise
 
 
-def process_extraction(urls, user_id, submission_id, db: Session):
+async def read_limited(response: aiohttp.ClientResponse, limit: int) -> bytearray:
+    """Read a response body, giving up as soon as it is larger than limit bytes."""
+    too_large = ValueError(f"Document is larger than {limit // 2**20} MB")
+    if response.content_length and response.content_length > limit:
+        raise too_large
+    content = bytearray()
+    async for chunk in response.content.iter_chunked(1024 * 1024):
+        content.extend(chunk)
+        if len(content) > limit:
+            raise too_large
+    return content
+
+
+async def extract_from_url(session: aiohttp.ClientSession, url: str, doc_type: str):
+    """
+    Download a document and extract it, returning (url, doc_type, extraction,
+    timings). Failures are returned as an extraction with an 'error' key.
+    """
+    timings = timing.start_document(doc_type)
+    try:
+        limit = await asyncio.to_thread(max_document_bytes)
+        # Fetch the file content from the URL
+        with timing.span("download"):
+            async with session.get(url) as response:
+                if response.status != 200:
+                    raise ValueError(f"Failed to fetch the file from {url}")
+                file_content = await read_limited(response, limit)
+
+        # Use the custom data_extractor module instead of Azure extraction
+        extraction = await extract_document_async(file_content, doc_type)
+    except Exception as e:
+        extraction = {"error": str(e)}
+    finally:
+        timings.deactivate()
+    return url, doc_type, extraction, timings
+
+
+async def process_extraction(urls, user_id, submission_id, db: Session):
     """
     Process extraction tasks in the background using the custom data_extractor.
-    For each URL, download the file, determine the document type, extract and post-process the data,
-    then save the result in ApplicantDocuments.
+    All URLs are downloaded and extracted concurrently (OCR in the worker pool,
+    LLM calls overlapping up to the ner.concurrency limits); each result is
+    post-processed and saved in ApplicantDocuments as soon as it completes.
     """
+    db_submission = None
     try:
-        db_submission = (
-            db.query(Submissions).filter(Submissions.id == submission_id).first()
+        db_submission = await asyncio.to_thread(
+            lambda: db.query(Submissions)
+            .filter(Submissions.id == submission_id)
+            .first()
+        )
+        await asyncio.to_thread(
+            set_submission_status, db_submission, "extracting...", db
         )
-        db_submission.status = "extracting..."
-        db.commit()
-        db.refresh(db_submission)
-
-        for url, doc_type in urls:
-            try:
-                # Fetch the file content from the URL
-                response = requests.get(url)
-                if response.status_code != 200:
-                    raise ValueError(f"Failed to fetch the file from {url}")
 
-                file_content = response.content
-                file_stream = BytesIO(file_content)
-
-                # Determine document type from the URL filename (simple heuristic)
-                # lower_url = url.lower()
-                # if "aadhaar" in lower_url:
-                #     document_type = "aadhaar"
-                # elif "caste" in lower_url:
-                #     document_type = "caste"
-                # elif "school_cert" in lower_url:
-                #     document_type = "school_cert"
-                # elif "school_mark" in lower_url:
-                #     document_type = "school_mark"
-                # elif "uni_cert" in lower_url:
-                #     document_type = "uni_cert"
-                # elif "uni_mark" in lower_url:
-                #     document_type = "uni_mark"
-                # else:
-                #     document_type = "unknown"
-
-                # Use the custom data_extractor module instead of Azure extraction
-                extracted_data = data_extractor(file_stream, doc_type)
-                # Check for extraction errors
-                if "error" in extracted_data:
-                    logger.error(
-                        f"Extraction failed for {url}: {extracted_data['error']}"
+        # Download and extract every document concurrently; results are
+        # saved one at a time as they complete
+        async with aiohttp.ClientSession() as session:
+            extractions = [
+                extract_from_url(session, url, doc_type) for url, doc_type in urls
+            ]
+            for completed in asyncio.as_completed(extractions):
+                url, doc_type, extraction, timings = await completed
+                try:
+                    # Post-processing, encryption and the DB writes are
+                    # blocking; they run off the event loop so downloads and
+                    # LLM calls keep going meanwhile
+                    await asyncio.to_thread(
+                        save_extraction,
+                        url,
+                        doc_type,
+                        extraction,
+                        timings,
+                        user_id,
+                        db_submission,
+                        db,
+                    )
+                except Exception as e:
+                    logger.error(f"Error processing URL {url}: {str(e)}")
+                finally:
+                    timings.finish(
+                        submission_id=submission_id, ok="error" not in extraction
                     )
-                    continue
 
-                # Run post-processing as before
-                processed_data = process_extracted_data(extracted_data, doc_type)
+        await asyncio.to_thread(
+            set_submission_status,
+            db_submission,
+            "Completed Extracting for all documents",
+            db,
+        )
 
-                # *** Encrypt sensitive fields before saving ***
-                encrypted_data = encrypt_applicant_info_data(processed_data)
+        try:
+            await asyncio.to_thread(process_applicant_info, user_id=user_id, db=db)
+            logger.info("Applicant info successfully updated.")
 
-                formatted_data = {
-                    "document_type": doc_type,
-                    "data": encrypted_data,
-                    "metadata": {"file_url": url, "user_id": user_id},
-                }
+        except Exception as e:
+            logger.error(f"Error calling applicant info API: {str(e)}")
 
-                # Save extracted data into ApplicantDocuments
-                new_entry = ApplicantDocuments(
-                    user_id=user_id,
-                    file_name=url,
-                    doc_type=doc_type,
-                    extracted_content=formatted_data,
-                )
-                db.add(new_entry)
-                db.commit()
-                db.refresh(new_entry)
+    except Exception as e:
+        logger.error(f"Error in background classification task: {str(e)}")
 
-                db_submission.status = f"Extracted data for {doc_type}"
-                db.commit()
-                db.refresh(db_submission)
+        if db_submission:
+            await asyncio.to_thread(
+                set_submission_status, db_submission, f"Failed: {str(e)}", db
+            )
 
-                # Store unencrypted data for the applicant info API
-                # Note: We'll encrypt it just before sending
-                # extracted_applicant_data.update(processed_data)
 
-                logger.info(f"Completed extraction for {doc_type}: {processed_data}")
+def set_submission_status(db_submission: Submissions, status: str, db: Session):
+    db_submission.status = status
+    db.commit()
+    db.refresh(db_submission)
+
+
+def save_extraction(
+    url: str,
+    doc_type: str,
+    extraction: dict,
+    timings,
+    user_id: int,
+    db_submission: Submissions,
+    db: Session,
+):
+    """Post-process, encrypt and save one document's extraction."""
+    classification = extraction.get("classification")
+    if classification:
+        # Extraction used the confirmed or corrected doc_type
+        save_classification(user_id, url, classification, db)
+        doc_type = classification["doc_type"]
+
+    if "error" in extraction:
+        logger.error(f"Extraction failed for {url}: {extraction['error']}")
+        if "ocr" not in extraction:
+            return
+        # OCR succeeded: keep the document and its OCR text so only the
+        # fields need extracting again
+        extracted_data = {}
+    else:
+        extracted_data = extraction["entities"]
+
+    # Run post-processing as before
+    with timings.span("post_process"):
+        processed_data = process_extracted_data(extracted_data, doc_type)
 
-            except Exception as e:
-                logger.error(f"Error processing URL {url}: {str(e)}")
+    # *** Encrypt sensitive fields before saving ***
+    with timings.span("encrypt"):
+        encrypted_data = encrypt_applicant_info_data(processed_data)
+        ocr_text = encrypt_field(json.dumps(extraction["ocr"]))
 
-        db_submission.status = "Completed Extracting for all documents"
+    formatted_data = {
+        "document_type": doc_type,
+        "data": encrypted_data,
+        "metadata": {"file_url": url, "user_id": user_id},
+    }
+    if extraction.get("incomplete_fields"):
+        # Re-extracted with POST /documents/{id}/complete-fields
+        formatted_data["incomplete_fields"] = extraction["incomplete_fields"]
+
+    # Save extracted data into ApplicantDocuments
+    with timings.span("db_write"):
+        new_entry = ApplicantDocuments(
+            user_id=user_id,
+            file_name=url,
+            doc_type=doc_type,
+            extracted_content=formatted_data,
+            ocr_text=ocr_text,
+        )
+        db.add(new_entry)
         db.commit()
-        db.refresh(db_submission)
+        db.refresh(new_entry)
 
-        try:
-            process_applicant_info(user_id=user_id, db=db)
-            logger.info("Applicant info successfully updated.")
+    set_submission_status(db_submission, f"Extracted data for {doc_type}", db)
 
-        except Exception as e:
-            logger.error(f"Error calling applicant info API: {str(e)}")
+    # Store unencrypted data for the applicant info API
+    # Note: We'll encrypt it just before sending
+    # extracted_applicant_data.update(processed_data)
 
-    except Exception as e:
-        logger.error(f"Error in background classification task: {str(e)}")
+    logger.info(f"Completed extraction for {doc_type}: {processed_data}")
 
-        if db_submission:
-            db_submission.status = f"Failed: {str(e)}"
-            db.commit()
-            db.refresh(db_submission)
+
+def save_classification(user_id: int, url: str, classification: dict, db: Session):
+    """Record the classifier's decision for an uploaded document."""
+    db_classified_document = ClassifiedDocuments(
+        user_id=user_id,
+        file_name=url,
+        document_type=classification["doc_type"],
+        confidence=classification["confidence"],
+    )
+    db.add(db_classified_document)
+    db.commit()
+
+
+def complete_document_fields(document: ApplicantDocuments, db: Session) -> dict:
+    """
+    Re-extract only the fields a document's extraction left missing or
+    invalid, over its stored OCR text, and merge them into its data. The
+    document goes back to the review queue.
+    """
+    fields = (document.extracted_content or {}).get("incomplete_fields")
+    if not fields:
+        raise ValueError(f"Document {document.id} has no missing or invalid fields")
+    if not document.ocr_text:
+        raise ValueError(f"Document {document.id} has no stored OCR text")
+
+    ocr = json.loads(decrypt_field(document.ocr_text))
+    result = extract_fields(ocr["text"], document.doc_type, fields, ocr.get("lines"))
+    if "error" in result:
+        raise ValueError(
+            f"Field extraction failed for document {document.id}: {result['error']}"
+        )
+
+    processed_data = {}
+    if result["entities"]:
+        processed_data = process_extracted_data(result["entities"], document.doc_type)
+    content = dict(document.extracted_content)
+    data = decrypt_applicant_info_data(dict(content.get("data") or {}))
+    content["data"] = encrypt_applicant_info_data({**data, **processed_data})
+    set_incomplete_fields(content, result["incomplete_fields"])
+
+    document.extracted_content = content
+    document.is_reviewed = False
+    db.commit()
+    db.refresh(document)
+    logger.info(
+        f"Completed fields {list(result['entities'])} of document {document.id}; "
+        f"still incomplete: {result['incomplete_fields']}"
+    )
+    return result
+
+
+@app.post("/documents/{doc_id}/complete-fields")
+def complete_fields_for_document(
+    doc_id: int,
+    db: Session = Depends(get_db),
+    current_admin: Admin = Depends(get_current_admin),
+):
+    """
+    Ask the LLM again for only the missing or invalid fields of a document,
+    over its stored OCR text.
+    """
+    document = (
+        db.query(ApplicantDocuments).filter(ApplicantDocuments.id == doc_id).first()
+    )
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
+    try:
+        result = complete_document_fields(document, db)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "message": "Field extraction completed",
+        "document_id": doc_id,
+        "recovered_fields": list(result["entities"]),
+        "incomplete_fields": result["incomplete_fields"],
+    }
+
+
+@app.post("/documents/{doc_id}/rerun-ner")
+def rerun_ner_for_document(
+    doc_id: int,
+    db: Session = Depends(get_db),
+    current_admin: Admin = Depends(get_current_admin),
+):
+    """Re-run NER and post-processing on stored OCR text, without re-OCR."""
+    document = (
+        db.query(ApplicantDocuments).filter(ApplicantDocuments.id == doc_id).first()
+    )
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
+    try:
+        rerun_document_ner(document, db)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"message": "NER re-run completed", "document_id": doc_id}
+
+
+async def rerun_ner_for_doc_type(doc_type: str, db: Session):
+    documents = await asyncio.to_thread(
+        lambda: db.query(ApplicantDocuments)
+        .filter(
+            ApplicantDocuments.doc_type == doc_type,
+            ApplicantDocuments.ocr_text.isnot(None),
+        )
+        .all()
+    )
+    done, failed = await rerun_documents_ner(documents, db)
+    logger.info(f"Re-ran NER for {done} {doc_type} documents ({failed} failed)")
+
+
+@app.post("/documents/rerun-ner/{doc_type}")
+def rerun_ner_for_category(
+    doc_type: str,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    current_admin: Admin = Depends(get_current_admin),
+):
+    """Schedule an NER re-run for every document of a doc_type with stored OCR text."""
+    background_tasks.add_task(rerun_ner_for_doc_type, doc_type, db)
+    return {"message": f"NER re-run scheduled for {doc_type} documents."}
 
 
 @app.post("/applicantinfo/", response_model=ApplicantInfoCreate)
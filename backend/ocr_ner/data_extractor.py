@@ -1,7 +1,16 @@
+import argparse
+import asyncio
+import resource
+import time
 from io import BytesIO
-from PIL import Image
-from .src.document_loader import load_documents
-from .src.pipeline import DocumentProcessingPipeline
+from typing import Union
+from .src.document_loader import iter_documents, is_pdf
+from .src.ner_processor import NERProcessor
+from .src.pipeline import aadhaar_qr_fallback_rate, layout_template_hit_rate
+from .src.pipeline import load_config
+from .src.registry import registry
+from .src.metrics import metrics
+from .src import timing
 import json
 import os
 import logging
@@ -9,88 +18,494 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# Resolve config path relative to the ocr_ner package
+CONFIG_PATH = os.path.join(os.path.dirname(__file__), "config", "config.yaml")
 
-def extract_data(file_stream: BytesIO, doc_type: str):
+# NER processor built on its own by load_ner, for processes that never OCR
+_ner = None
+
+
+def get_pipeline():
+    """Return the process-wide pipeline, loading it on first use."""
+    return registry.get(CONFIG_PATH)
+
+
+def warm_up():
+    """Load and warm the pipeline so the first request does not pay the cold start."""
+    registry.get(CONFIG_PATH, warm=True)
+
+
+def load_ner():
+    """
+    Build only the NER side of the pipeline, for re-runs over stored OCR text:
+    no OCR models or worker processes are loaded.
+    """
+    global _ner
+    _ner = NERProcessor(load_config(CONFIG_PATH))
+    return _ner
+
+
+def get_ner():
+    """The NER processor built by load_ner, else the full pipeline's."""
+    return _ner or get_pipeline().ner
+
+
+def shutdown():
+    """Stop the pipelines loaded in this process, including OCR worker processes."""
+    global _ner
+    _ner = None
+    registry.close()
+
+
+def configure_cache(db_backend=None, cipher=None):
+    """
+    Attach the database cache backend and the cipher used to encrypt cached
+    entities. The backend is only used when cache.backend is "db" in config.yaml.
+    """
+    get_pipeline().configure_cache(db_backend=db_backend, cipher=cipher)
+
+
+def pipeline_status():
+    """Load time, warm/cold status and counters of the pipelines in this process."""
+    return {
+        "pipelines": registry.status(),
+        "aadhaar_qr_fallback_rate": round(aadhaar_qr_fallback_rate(), 4),
+        "layout_template_hit_rate": round(layout_template_hit_rate(), 4),
+        **metrics.snapshot(),
+    }
+
+
+def pipeline_timings():
+    """p50/p95 latency of each pipeline stage, by doc_type."""
+    return timing.stage_latencies()
+
+
+def check_upload(fileobj):
+    """
+    Check an uploaded document from its size and header, without reading it
+    into memory.
+
+    Raises:
+        ImageRejected: A ValueError, if the document must be refused.
+    """
+    get_pipeline().image_guard.check_stream(fileobj)
+
+
+def max_document_bytes():
+    """Largest encoded document, image or PDF, the pipeline accepts."""
+    return get_pipeline().image_guard.config["max_bytes"]
+
+
+def extract_data(file_stream: Union[BytesIO, bytes], doc_type: str):
     """
     Extract entities from a document file stream using OCR and NER.
 
     Args:
-        file_stream (BytesIO): The file stream containing the document image.
+        file_stream (BytesIO | bytes): The document image or PDF.
         doc_type (str): The type of document (e.g., 'school_cert', 'aadhaar').
 
     Returns:
         dict: Extracted entities, or a dict with an 'error' key if processing fails.
     """
-    # Load the image from the file stream
-    image = Image.open(file_stream)
+    result = extract_document(file_stream, doc_type)
+    if "error" in result:
+        return {"error": result["error"]}
+    return result["entities"]
+
+
+def extract_document(file_stream: Union[BytesIO, bytes], doc_type: str):
+    """Synchronous wrapper around extract_document_async for threads and scripts."""
+    return asyncio.run(extract_document_async(file_stream, doc_type))
+
+
+async def extract_document_async(file_stream: Union[BytesIO, bytes], doc_type: str):
+    """
+    Extract entities from a document file stream and keep its OCR output.
+
+    OCR runs in worker processes or threads and NER on the async LLM client,
+    so many documents can be extracted concurrently on one event loop.
+
+    Args:
+        file_stream (BytesIO | bytes): The document image or PDF. Bytes and
+            bytearrays are read in place; a BytesIO through its buffer.
+        doc_type (str): The type of document (e.g., 'school_cert', 'aadhaar').
+
+    Returns:
+        dict: "entities", "ocr" ({"text", "lines"} with per-line confidence),
+        "incomplete_fields" ({field: "missing" | "invalid"} still unresolved
+        after the follow-up prompt, when any) and, with the classifier
+        enabled, "classification" (the confirmed or corrected doc_type the
+        entities were extracted as); or a dict with an 'error' key (and "ocr"
+        and "incomplete_fields", every field, when OCR succeeded).
+    """
+    if timing.current() is not None:
+        # The caller times the document, e.g. from download to database write
+        return await _extract_document_async(file_stream, doc_type)
+    timings = timing.start_document(doc_type)
+    try:
+        return await _extract_document_async(file_stream, doc_type)
+    finally:
+        timings.finish()
+        timings.deactivate()
+
+
+async def _extract_document_async(file_stream, doc_type):
+    if isinstance(file_stream, BytesIO):
+        file_bytes = file_stream.getbuffer()
+    else:
+        file_bytes = memoryview(file_stream)
 
     # Create a document dictionary
     document = {
         "path": "stream",  # Identifier for stream-based input
-        "image": image,
         "doc_type": doc_type,
     }
+    if is_pdf(file_bytes):
+        # PDF pages are rasterized lazily by the pipeline
+        document["pdf"] = file_bytes
+    try:
+        # Shared pipeline, loaded once per process
+        pipeline = await asyncio.to_thread(get_pipeline)
+        # Oversized, malformed and pathological files are rejected from their
+        # size and header, before anything is decoded
+        plan = pipeline.image_guard.check(file_bytes)
 
-    # Resolve config path relative to the ocr_ner package
-    config_path = os.path.join(os.path.dirname(__file__), "config", "config.yaml")
+        # Identical file, doc_type, prompt and model: reuse the stored result
+        if pipeline.cache is not None:
+            with timing.span("cache"):
+                cached = await asyncio.to_thread(
+                    pipeline.cache.get, file_bytes, doc_type
+                )
+            if cached is not None:
+                logger.info(f"Extraction cache hit for {doc_type}")
+                return cached
 
-    # Initialize the pipeline
-    pipeline = DocumentProcessingPipeline(config_path)
+        # Documents wait until their decoded size fits the process budget
+        await pipeline.memory_budget.acquire(plan["bytes"])
+        try:
+            if "pdf" not in document:
+                # Decoded once (at reduced scale past the pixel budget), straight
+                # into the array the whole pipeline works on
+                with timing.span("decode"):
+                    document["image"] = await asyncio.to_thread(
+                        pipeline.image_guard.decode, file_bytes, plan
+                    )
 
-    try:
-        # Process the document without saving OCR output
-        result = pipeline.process_document(document, output_dir=None)
+            # Process the document without saving OCR output
+            result = await pipeline.aprocess_document(document, output_dir=None)
+        finally:
+            pipeline.memory_budget.release(plan["bytes"])
+        logger.info(
+            f"Processed {doc_type}: {_image_copies(result)} image copies, "
+            f"peak RSS {_peak_rss_mb():.0f} MB"
+        )
         # Verify the result is a dictionary
         if not isinstance(result, dict):
             logger.error(f"Expected a dictionary, but got {type(result)}")
             return {"error": f"Invalid result type: {type(result)}"}
-        # Check for the 'entities' key
-        entities = result.get("entities")
-        if entities is None:
-            logger.error("'entities' key not found in result")
-            return {"error": "'entities' key missing"}
-        # Ensure entities is in the expected format (e.g., dict or list)
-        if not isinstance(entities, (dict, list)):
-            logger.error(f"Invalid entities format: {type(entities)}")
-            return {"error": "Invalid entities format"}
+        ocr = {"text": result.get("text", ""), "lines": result.get("lines", [])}
+        classification = result.get("metadata", {}).get("classification")
+        extracted_as = classification["doc_type"] if classification else doc_type
+        entities = _check_entities(result.get("entities"))
+        # Fields the stored OCR text can still be asked for, without re-OCR
+        incomplete = pipeline.ner.incomplete_fields(entities, extracted_as)
+        if "error" in entities:
+            error = {
+                "error": entities["error"],
+                "ocr": ocr,
+                "incomplete_fields": incomplete,
+            }
+            if classification:
+                error["classification"] = classification
+            return error
+
         logger.info(f"Extracted entities: {entities}")
-        return entities
+        extraction = {"entities": entities, "ocr": ocr}
+        if incomplete:
+            logger.info(f"Incomplete {extracted_as} fields: {incomplete}")
+            extraction["incomplete_fields"] = incomplete
+        if classification:
+            extraction["classification"] = classification
+        if pipeline.cache is not None:
+            # Looked up by the requested doc_type, before classification;
+            # checked against the prompt it was really extracted with
+            await asyncio.to_thread(
+                pipeline.cache.set, file_bytes, doc_type, extraction, extracted_as
+            )
+        return extraction
     except Exception as e:
         logger.error(f"Error in extract_data: {str(e)}")
         return {"error": str(e)}
 
-    # Return the extracted entities
-    # return result["entities"]
+
+def rerun_ner(ocr_text: str, doc_type: str, lines: list = None):
+    """
+    Re-run only NER over stored OCR text, e.g. after a prompt change.
+
+    Args:
+        ocr_text (str): OCR text as returned in extract_document()["ocr"]["text"].
+        doc_type (str): The type of document (e.g., 'school_cert', 'aadhaar').
+        lines (list, optional): The stored OCR lines; with their confidence
+            the prompt text is compacted more precisely.
+
+    Returns:
+        dict: Extracted entities, or a dict with an 'error' key if NER fails.
+    """
+    try:
+        entities = get_ner().extract_entities(ocr_text, doc_type, lines)
+        return _check_entities(entities)
+    except Exception as e:
+        logger.error(f"Error in rerun_ner: {str(e)}")
+        return {"error": str(e)}
+
+
+async def rerun_ner_async(ocr_text: str, doc_type: str, lines: list = None):
+    """Async counterpart of rerun_ner, sharing the NER concurrency limits."""
+    try:
+        ner = await asyncio.to_thread(get_ner)
+        entities = await ner.aextract_entities(ocr_text, doc_type, lines)
+        return _check_entities(entities)
+    except Exception as e:
+        logger.error(f"Error in rerun_ner: {str(e)}")
+        return {"error": str(e)}
+
+
+def extract_fields(ocr_text: str, doc_type: str, fields, lines: list = None):
+    """
+    Re-extract only some fields over stored OCR text, e.g. those an extraction
+    left missing or invalid: one short LLM prompt, no OCR.
+
+    Args:
+        ocr_text (str): OCR text as returned in extract_document()["ocr"]["text"].
+        doc_type (str): The type of document (e.g., 'school_cert', 'aadhaar').
+        fields (list | dict): The fields to ask for.
+        lines (list, optional): The stored OCR lines.
+
+    Returns:
+        dict: "entities" (the fields recovered with a usable value) and
+        "incomplete_fields" (those still missing or invalid), or a dict with
+        an 'error' key.
+    """
+    try:
+        ner = get_ner()
+        answers = ner.extract_fields(ocr_text, doc_type, fields, lines)
+        return _recovered_fields(ner, answers, fields)
+    except Exception as e:
+        logger.error(f"Error in extract_fields: {str(e)}")
+        return {"error": str(e)}
+
+
+async def extract_fields_async(ocr_text: str, doc_type: str, fields, lines=None):
+    """Async counterpart of extract_fields, sharing the NER concurrency limits."""
+    try:
+        ner = await asyncio.to_thread(get_ner)
+        answers = await ner.aextract_fields(ocr_text, doc_type, fields, lines)
+        return _recovered_fields(ner, answers, fields)
+    except Exception as e:
+        logger.error(f"Error in extract_fields: {str(e)}")
+        return {"error": str(e)}
+
+
+def incomplete_fields(entities: dict, doc_type: str) -> dict:
+    """The doc_type's fields that entities lack or give in an invalid format."""
+    return get_ner().incomplete_fields(entities, doc_type)
+
+
+def _recovered_fields(ner, answers, fields):
+    answers = _check_entities(answers)
+    if "error" in answers:
+        return answers
+    entities, incomplete = {}, {}
+    for field in fields:
+        problem = ner.field_problem(field, answers.get(field))
+        if problem:
+            incomplete[field] = problem
+        else:
+            entities[field] = answers[field]
+    return {"entities": entities, "incomplete_fields": incomplete}
+
+
+def _image_copies(result):
+    # The decode itself plus any copies made while preprocessing
+    preprocessing = result.get("metadata", {}).get("preprocessing", {})
+    return 1 + preprocessing.get("copies", 0)
+
+
+def _peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _check_entities(entities):
+    # Check for the 'entities' key
+    if entities is None:
+        logger.error("'entities' key not found in result")
+        return {"error": "'entities' key missing"}
+    # Ensure entities is in the expected format (e.g., dict or list)
+    if not isinstance(entities, (dict, list)):
+        logger.error(f"Invalid entities format: {type(entities)}")
+        return {"error": "Invalid entities format"}
+    if isinstance(entities, dict) and "error" in entities:
+        logger.error(f"Entity extraction failed: {entities['error']}")
+        return {"error": entities["error"]}
+    return entities
+
+
+def _read_file(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _finished_paths(output_path, checkpoint_path):
+    """Paths recorded in the checkpoint, or in the output if the run crashed
+    between writing a result and checkpointing it."""
+    finished = set()
+    if os.path.exists(checkpoint_path):
+        with open(checkpoint_path, encoding="utf-8") as f:
+            finished.update(line.rstrip("\n") for line in f if line.strip())
+    if os.path.exists(output_path):
+        with open(output_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    finished.add(json.loads(line)["path"])
+                except (ValueError, KeyError):
+                    # A line cut short by a crash; its document is redone
+                    continue
+    return finished
+
+
+async def extract_batch(
+    documents,
+    output_path,
+    checkpoint_path,
+    concurrency=4,
+    prefetch=8,
+    include_ocr=False,
+):
+    """
+    Extract documents concurrently, appending one JSON line per document to
+    `output_path` as each finishes.
+
+    At most `prefetch` files are read ahead of the `concurrency` documents
+    being extracted. Finished paths are appended to `checkpoint_path`, and
+    documents already finished by an earlier run are skipped.
+
+    Args:
+        documents (iterable): {"path", "doc_type"} dicts, e.g. from iter_documents.
+
+    Returns:
+        dict: Counts of "ok", "error" and "skipped" documents.
+    """
+    finished = _finished_paths(output_path, checkpoint_path)
+    queue = asyncio.Queue(maxsize=prefetch)
+    counts = {"ok": 0, "error": 0, "skipped": 0}
+    start = time.perf_counter()
+
+    async def produce():
+        for document in documents:
+            if document["path"] in finished:
+                counts["skipped"] += 1
+                continue
+            try:
+                data = await asyncio.to_thread(_read_file, document["path"])
+            except OSError as e:
+                data = e
+            await queue.put((document, data))
+        for _ in range(concurrency):
+            await queue.put(None)
+
+    async def work(output, checkpoint):
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            document, data = item
+            if isinstance(data, Exception):
+                extraction = {"error": str(data)}
+            elif document["doc_type"] is None:
+                extraction = {"error": "No doc_type given"}
+            else:
+                extraction = await extract_document_async(data, document["doc_type"])
+
+            record = {"path": document["path"], "doc_type": document["doc_type"]}
+            if "error" in extraction:
+                record["error"] = extraction["error"]
+                counts["error"] += 1
+            else:
+                record["entities"] = extraction["entities"]
+                counts["ok"] += 1
+            for key in ("incomplete_fields", "classification"):
+                if extraction.get(key):
+                    record[key] = extraction[key]
+            if include_ocr and "ocr" in extraction:
+                record["ocr"] = extraction["ocr"]
+
+            # Result first, then checkpoint: a crash in between is caught by
+            # _finished_paths reading the output
+            output.write(json.dumps(record, ensure_ascii=False) + "\n")
+            output.flush()
+            checkpoint.write(document["path"] + "\n")
+            checkpoint.flush()
+
+            done = counts["ok"] + counts["error"]
+            status = "error" if "error" in record else "ok"
+            rate = done / (time.perf_counter() - start)
+            print(f"[{done}] {document['path']}: {status} ({rate:.2f} docs/s)")
+
+    for path in (output_path, checkpoint_path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(output_path, "a", encoding="utf-8") as output, open(
+        checkpoint_path, "a", encoding="utf-8"
+    ) as checkpoint:
+        await asyncio.gather(
+            produce(), *(work(output, checkpoint) for _ in range(concurrency))
+        )
+    return counts
 
 
 def main():
-    pipeline = DocumentProcessingPipeline("config/config.yaml")
-    documents = load_documents(pipeline.config["paths"]["input_dir"])
-
-    # Define output directory and filename
-    output_dir = "./data/output"
-    os.makedirs(
-        output_dir, exist_ok=True
-    )  # Create output directory if it doesn't exist
-    output_file = os.path.join(output_dir, "extracted_data.json")
-
-    # TODO: Add document classification here
-    # For now, hardcode document type
-    for doc in documents:
-        doc["doc_type"] = "school_certificate"  # Example
-
-        result = pipeline.process_document(doc)
-        print(f"Processed {doc['path']}:")
-        # print(result["entities"])
-
-        # Print the JSON representation for debugging
-        extracted_data = result["entities"]  # Extract entities from the result
-        print(json.dumps(extracted_data, indent=4, ensure_ascii=False))
-
-    # Save extracted JSON to output file
-    with open(output_file, "w", encoding="utf-8") as f:
-        json.dump(extracted_data, f, indent=4, ensure_ascii=False)
-    print(f"Output saved to {output_file}")
+    parser = argparse.ArgumentParser(
+        description="Extract a directory of documents to JSONL, resumably."
+    )
+    parser.add_argument(
+        "--input-dir", help="Defaults to paths.input_dir in config.yaml"
+    )
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--doc-type", help="doc_type of every document")
+    group.add_argument("--manifest", help="CSV with path and doc_type columns")
+    parser.add_argument("--output", default="data/output/extracted_data.jsonl")
+    parser.add_argument(
+        "--checkpoint", help="Finished paths; defaults to <output>.checkpoint"
+    )
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--prefetch", type=int, default=8)
+    parser.add_argument("--include-ocr", action="store_true")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    config = get_pipeline().config
+    if args.doc_type and args.doc_type not in config["doc_types"]:
+        parser.error(f"Unknown doc_type {args.doc_type}; see doc_types in config.yaml")
+
+    documents = iter_documents(
+        args.input_dir or config["paths"]["input_dir"],
+        doc_type=args.doc_type,
+        manifest=args.manifest,
+    )
+    try:
+        counts = asyncio.run(
+            extract_batch(
+                documents,
+                args.output,
+                args.checkpoint or f"{args.output}.checkpoint",
+                concurrency=args.concurrency,
+                prefetch=args.prefetch,
+                include_ocr=args.include_ocr,
+            )
+        )
+    finally:
+        shutdown()
+    print(f"Done: {counts} -> {args.output}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,180 @@
+import re
+import xml.etree.ElementTree as ET
+import zlib
+
+import cv2
+import numpy as np
+
+# Byte separating the fields of a secure QR payload
+SECURE_QR_DELIMITER = 255
+
+# Secure QR text fields, in payload order after the optional version marker
+SECURE_QR_FIELDS = [
+    "email_mobile_indicator",
+    "reference_id",
+    "name",
+    "dob",
+    "gender",
+    "care_of",
+    "district",
+    "landmark",
+    "house",
+    "location",
+    "pincode",
+    "post_office",
+    "state",
+    "street",
+    "sub_district",
+    "vtc",
+]
+
+# Address parts, most to least specific
+ADDRESS_PARTS = [
+    "house",
+    "street",
+    "landmark",
+    "location",
+    "vtc",
+    "post_office",
+    "sub_district",
+    "district",
+    "state",
+    "pincode",
+]
+
+# Attributes of the older XML QR, mapped to the secure QR field names
+XML_QR_ATTRIBUTES = {
+    "uid": "uid",
+    "name": "name",
+    "gender": "gender",
+    "dob": "dob",
+    "yob": "yob",
+    "co": "care_of",
+    "house": "house",
+    "street": "street",
+    "lm": "landmark",
+    "loc": "location",
+    "vtc": "vtc",
+    "po": "post_office",
+    "subdist": "sub_district",
+    "dist": "district",
+    "state": "state",
+    "pc": "pincode",
+}
+
+GENDERS = {"M": "Male", "F": "Female", "T": "Transgender"}
+
+RELATION_PREFIX = re.compile(r"^\s*[CSDW]\s*/\s*O\s*:?\s*", re.IGNORECASE)
+AADHAAR_NUMBER = re.compile(r"(?<!\d)(\d{4})\s?(\d{4})\s?(\d{4})(?!\d)")
+
+
+def detect_and_decode(image):
+    """
+    Find and decode a QR code in a PIL image or numpy array.
+
+    Returns:
+        str or None: The decoded payload, or None if no QR code could be read.
+    """
+    img = np.asarray(image)
+    gray = img if img.ndim == 2 else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    detector = cv2.QRCodeDetector()
+    # Secure QR codes are dense; a binarized copy often decodes when the scan does not
+    binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
+    for candidate in (gray, binary):
+        data, points, _ = detector.detectAndDecode(candidate)
+        if data:
+            return data
+    return None
+
+
+def parse_payload(data):
+    """
+    Parse an Aadhaar QR payload: the older XML format or the digits-only
+    secure QR (a big integer holding a gzip-compressed, 255-delimited record).
+
+    Returns:
+        dict: Decoded fields, with "uid" for XML codes and "reference_id"
+        (whose first 4 digits are the last 4 of the Aadhaar number) for secure QR.
+
+    Raises:
+        ValueError: If the payload is not an Aadhaar QR code.
+    """
+    data = data.strip()
+    if data.startswith("<"):
+        return _parse_xml(data)
+    if data.isdigit():
+        return _parse_secure(data)
+    raise ValueError("Not an Aadhaar QR payload")
+
+
+def _parse_xml(data):
+    try:
+        root = ET.fromstring(data)
+    except ET.ParseError as e:
+        raise ValueError(f"Malformed XML QR payload: {str(e)}")
+    if "uid" not in root.attrib:
+        raise ValueError("XML QR payload has no uid")
+    return {
+        field: root.attrib[attribute].strip()
+        for attribute, field in XML_QR_ATTRIBUTES.items()
+        if attribute in root.attrib
+    }
+
+
+def _parse_secure(data):
+    number = int(data)
+    raw = number.to_bytes((number.bit_length() + 7) // 8, "big")
+    try:
+        payload = zlib.decompress(raw, 16 + zlib.MAX_WBITS)
+    except zlib.error as e:
+        raise ValueError(f"Secure QR payload is not gzip data: {str(e)}")
+
+    parts = payload.split(bytes([SECURE_QR_DELIMITER]))
+    # Version 2 onwards starts with a "V2"-style marker
+    if re.fullmatch(rb"V\d+", parts[0]):
+        parts = parts[1:]
+    if len(parts) < len(SECURE_QR_FIELDS):
+        raise ValueError("Secure QR payload has too few fields")
+    return {
+        field: parts[i].decode("iso-8859-1").strip()
+        for i, field in enumerate(SECURE_QR_FIELDS)
+    }
+
+
+def to_entities(fields):
+    """Map decoded QR fields onto the aadhaar entity schema."""
+    if fields.get("dob"):
+        dob = fields["dob"]
+    else:
+        dob = fields.get("yob", "")
+    address = ", ".join(fields[p] for p in ADDRESS_PARTS if fields.get(p))
+    gender = fields.get("gender", "")
+    return {
+        "name": fields.get("name", ""),
+        "gender": GENDERS.get(gender.upper(), gender),
+        "dob": dob,
+        "aadhaarno": format_number(fields["uid"]) if fields.get("uid") else "",
+        "fathername": RELATION_PREFIX.sub("", fields.get("care_of", "")),
+        "address": address,
+    }
+
+
+def format_number(digits):
+    return f"{digits[:4]} {digits[4:8]} {digits[8:12]}"
+
+
+def find_number(text, last_four):
+    """
+    Find the Aadhaar number in OCR text whose last 4 digits match the ones
+    embedded in a secure QR code.
+    """
+    for match in AADHAAR_NUMBER.finditer(text):
+        digits = "".join(match.groups())
+        if digits.endswith(last_four):
+            return format_number(digits)
+    return None
+
+
+def render_text(entities):
+    """Plain-text form of QR entities, stored in place of OCR text."""
+    return "\n".join(f"{key}: {value}" for key, value in entities.items() if value)
@@ -0,0 +1,77 @@
+import re
+
+
+def _pattern(keyword):
+    # OCR splits and joins words unpredictably: match any run of whitespace
+    words = (re.escape(word) for word in keyword.lower().split())
+    return re.compile(r"\b" + r"\s+".join(words) + r"\b")
+
+
+class DocumentClassifier:
+    """
+    Keyword scoring of OCR text against each doc_type, run before the NER
+    prompt is chosen to confirm or correct the doc_type an upload was
+    declared as.
+
+    Each doc_type lists weighted keywords under classifier.keywords in
+    config.yaml; a document's score for a doc_type is the summed weight of
+    the keywords found in its text. The declared doc_type is only replaced
+    by a clearly better scoring one.
+    """
+
+    def __init__(self, config):
+        self.keywords = {
+            doc_type: [
+                (_pattern(keyword), weight) for keyword, weight in keywords.items()
+            ]
+            for doc_type, keywords in config.get("keywords", {}).items()
+        }
+        # Keyword weight the best doc_type needs before it can replace the declared one
+        self.min_score = config.get("min_score", 3.0)
+        # Its share of the best and declared scores combined
+        self.min_confidence = config.get("min_confidence", 0.7)
+
+    def scores(self, text):
+        text = text.lower()
+        return {
+            doc_type: float(
+                sum(weight for pattern, weight in keywords if pattern.search(text))
+            )
+            for doc_type, keywords in self.keywords.items()
+        }
+
+    def classify(self, text, declared):
+        """
+        Returns:
+            dict: "declared", "doc_type" (the declared one unless corrected),
+            "corrected", "confidence" (the doc_type's share of its score and
+            the best other score, 0.5 on a tie) and "scores".
+        """
+        scores = self.scores(text)
+        doc_type = declared
+        if scores:
+            best = max(scores, key=scores.get)
+            declared_score = scores.get(declared, 0.0)
+            if (
+                best != declared
+                and scores[best] >= self.min_score
+                and _share(scores[best], declared_score) >= self.min_confidence
+            ):
+                doc_type = best
+
+        score = scores.get(doc_type, 0.0)
+        runner_up = max(
+            (value for key, value in scores.items() if key != doc_type), default=0.0
+        )
+        return {
+            "declared": declared,
+            "doc_type": doc_type,
+            "corrected": doc_type != declared,
+            "confidence": round(_share(score, runner_up), 4),
+            "scores": scores,
+        }
+
+
+def _share(score, other):
+    total = score + other
+    return score / total if total else 0.0
@@ -1,20 +1,103 @@
+import csv
 import os
-from PIL import Image
-
-
-def load_documents(input_dir: str):
-    """Load document images from directory"""
-    supported_ext = [".png", ".jpg", ".jpeg", ".pdf"]
-    documents = []
-
-    for filename in os.listdir(input_dir):
-        if any(filename.lower().endswith(ext) for ext in supported_ext):
-            img_path = os.path.join(input_dir, filename)
-            documents.append(
-                {
-                    "path": img_path,
-                    "image": Image.open(img_path),
-                    "doc_type": None,  # To be filled by classifier
-                }
+import cv2
+import numpy as np
+import pymupdf
+
+PDF_MAGIC = b"%PDF"
+SUPPORTED_EXTENSIONS = (".png", ".jpg", ".jpeg", ".pdf")
+
+
+def is_pdf(data):
+    """Check the leading bytes of a document for the PDF signature"""
+    return bytes(data[: len(PDF_MAGIC)]) == PDF_MAGIC
+
+
+def decode_image(data):
+    """
+    Decode image bytes into a BGR numpy array, reading the encoded bytes in
+    place through a memoryview rather than via a PIL image and its copies.
+    OpenCV applies any EXIF orientation while decoding.
+
+    Args:
+        data (bytes | bytearray | memoryview): Encoded PNG/JPEG/... bytes.
+
+    Returns:
+        numpy.ndarray: HxWx3 uint8 BGR image.
+    """
+    buffer = np.frombuffer(memoryview(data), dtype=np.uint8)
+    img = cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+    if img is None:
+        raise ValueError("Unsupported or corrupt image data")
+    return img
+
+
+def iter_pdf_pages(source, dpi=200, max_pages=None, max_pixels=None):
+    """
+    Lazily rasterize PDF pages to BGR arrays, one page at a time.
+
+    Only the page being yielded is held in memory, so callers that consume
+    pages as they come are bounded by pages in flight, not by page count.
+
+    Args:
+        source (str | bytes): Path to a PDF file or the PDF bytes.
+        dpi (int): Target rasterization resolution.
+        max_pages (int, optional): Stop after this many pages.
+        max_pixels (int, optional): Rasterize larger pages (posters, or page
+            sizes crafted to exhaust memory) at a lower resolution.
+
+    Yields:
+        numpy.ndarray: HxWx3 uint8 BGR page image, like decoded uploads.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        doc = pymupdf.open(stream=bytes(source), filetype="pdf")
+    else:
+        doc = pymupdf.open(source)
+    try:
+        for page_no, page in enumerate(doc):
+            if max_pages and page_no >= max_pages:
+                break
+            page_dpi = dpi
+            if max_pixels:
+                # Page size is in points, 72 to the inch
+                pixels = page.rect.width * page.rect.height * (dpi / 72) ** 2
+                if pixels > max_pixels:
+                    page_dpi = max(1, int(dpi * (max_pixels / pixels) ** 0.5))
+            pix = page.get_pixmap(
+                dpi=page_dpi, colorspace=pymupdf.csRGB, alpha=False
             )
-    return documents
+            page_image = np.frombuffer(pix.samples, dtype=np.uint8).reshape(
+                pix.height, pix.width, pix.n
+            )
+            # The rest of the pipeline works on BGR, as cv2 decodes images
+            yield cv2.cvtColor(page_image, cv2.COLOR_RGB2BGR)
+    finally:
+        doc.close()
+
+
+def iter_documents(input_dir, doc_type=None, manifest=None):
+    """
+    Lazily list the documents of a directory, or of a manifest, without
+    reading them.
+
+    Args:
+        input_dir (str): Directory of documents; manifest paths are relative to it.
+        doc_type (str, optional): doc_type of every document not given one
+            by the manifest.
+        manifest (str, optional): CSV file with "path" and "doc_type" columns.
+
+    Yields:
+        dict: {"path", "doc_type"} per document.
+    """
+    if manifest:
+        with open(manifest, newline="") as f:
+            for row in csv.DictReader(f):
+                yield {
+                    "path": os.path.join(input_dir, row["path"]),
+                    "doc_type": row.get("doc_type") or doc_type,
+                }
+        return
+
+    for filename in sorted(os.listdir(input_dir)):
+        if filename.lower().endswith(SUPPORTED_EXTENSIONS):
+            yield {"path": os.path.join(input_dir, filename), "doc_type": doc_type}
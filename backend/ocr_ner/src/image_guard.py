@@ -0,0 +1,230 @@
+import asyncio
+import logging
+import os
+import threading
+import warnings
+from io import BytesIO
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from .document_loader import PDF_MAGIC, is_pdf
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    # Encoded size of any document, image or PDF
+    "max_bytes": 40 * 1024 * 1024,
+    # Images with more pixels than this (by their header) are rejected unread
+    "max_pixels": 120_000_000,
+    # Larger images are decoded at 1/2, 1/4 or 1/8 scale to get within this
+    "pixel_budget": 16_000_000,
+    # Strips such as 100000x10 are not documents
+    "max_aspect_ratio": 20,
+    "formats": ["JPEG", "PNG", "WEBP", "TIFF", "BMP"],
+    # Decoded image bytes one process works on at once, counting working copies
+    "memory_budget_mb": 1024,
+    # Copies of the decoded image alive while preprocessing (denoise, threshold)
+    "working_copies": 4,
+}
+
+# Scale denominators OpenCV can decode at; JPEG scales during the DCT so the
+# full-size image is never allocated
+REDUCED_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+# Bytes read for the header check before falling back to the whole file;
+# JPEG dimensions follow any EXIF segments, TIFF ones can be anywhere
+HEADER_BYTES = 1024 * 1024
+
+
+class ImageRejected(ValueError):
+    """A document refused before decoding: too large, malformed or a bomb."""
+
+
+class ImageGuard:
+    """
+    Checks on encoded documents before they are decoded, and decoding of
+    large images at a reduced scale, so that the pixels a process allocates
+    are bounded by configuration rather than by what was uploaded.
+    """
+
+    def __init__(self, config=None):
+        self.config = {**DEFAULTS, **(config or {})}
+        self.formats = {f.upper() for f in self.config["formats"]}
+        self.pixel_budget = self.config["pixel_budget"]
+
+    def check(self, data):
+        """
+        Check an encoded document from its size and image header.
+
+        Returns:
+            dict: {"format", "width", "height", "scale", "bytes"} for images,
+            where scale is the reduced decoding denominator and bytes the
+            estimated working memory; {"format": "PDF", "bytes"} for PDFs.
+
+        Raises:
+            ImageRejected: If the document must not be decoded.
+        """
+        self._check_size(len(data))
+        if is_pdf(data):
+            return self._pdf_plan()
+        header = self._read_header(BytesIO(bytes(data[:HEADER_BYTES])))
+        if header is None and len(data) > HEADER_BYTES:
+            header = self._read_header(BytesIO(data))
+        if header is None:
+            self._reject("unreadable", "Unsupported or corrupt image data")
+        return self._plan(*header)
+
+    def check_stream(self, fileobj):
+        """
+        Check a seekable upload without reading it into memory; the stream
+        is left at its start.
+
+        Raises:
+            ImageRejected: If the upload must not be accepted.
+        """
+        fileobj.seek(0, os.SEEK_END)
+        size = fileobj.tell()
+        fileobj.seek(0)
+        self._check_size(size)
+        try:
+            if fileobj.read(len(PDF_MAGIC)) == PDF_MAGIC:
+                return self._pdf_plan()
+            fileobj.seek(0)
+            header = self._read_header(fileobj)
+        finally:
+            fileobj.seek(0)
+        if header is None:
+            self._reject("unreadable", "Unsupported or corrupt image data")
+        return self._plan(*header)
+
+    def decode(self, data, plan=None):
+        """
+        Decode image bytes into a BGR numpy array of at most pixel_budget
+        pixels (unless even 1/8 scale is over it).
+
+        Args:
+            data (bytes | bytearray | memoryview): Encoded image bytes.
+            plan (dict, optional): The result of check(), if already run.
+
+        Returns:
+            numpy.ndarray: HxWx3 uint8 BGR image.
+        """
+        plan = plan or self.check(data)
+        buffer = np.frombuffer(memoryview(data), dtype=np.uint8)
+        # Formats other than JPEG are decoded in full and then scaled down by
+        # OpenCV; max_pixels bounds that peak
+        img = cv2.imdecode(buffer, REDUCED_FLAGS[plan["scale"]])
+        if img is None:
+            self._reject("unreadable", "Unsupported or corrupt image data")
+        outcome = "reduced" if plan["scale"] > 1 else "full"
+        metrics.incr("ingest_images_total", outcome=outcome, format=plan["format"])
+        if plan["scale"] > 1:
+            logger.info(
+                f"Decoded {plan['width']}x{plan['height']} {plan['format']} at "
+                f"1/{plan['scale']} scale ({img.shape[1]}x{img.shape[0]})"
+            )
+        return img
+
+    def _check_size(self, size):
+        if size > self.config["max_bytes"]:
+            self._reject(
+                "too_large",
+                f"Document is {size / 2**20:.1f} MB; the limit is "
+                f"{self.config['max_bytes'] / 2**20:.0f} MB",
+            )
+
+    def _read_header(self, fileobj):
+        """(format, width, height) from the header, without decoding pixels."""
+        try:
+            with warnings.catch_warnings():
+                # Pixel limits are enforced below, by max_pixels
+                warnings.simplefilter("ignore", Image.DecompressionBombWarning)
+                with Image.open(fileobj) as img:
+                    return img.format, img.width, img.height
+        except Image.DecompressionBombError:
+            self._reject("too_many_pixels", "Image exceeds the pixel limit")
+        except Exception:
+            return None
+
+    def _plan(self, image_format, width, height):
+        if image_format not in self.formats:
+            self._reject("format", f"Unsupported image format {image_format}")
+        pixels = width * height
+        if not pixels:
+            self._reject("unreadable", "Image has no pixels")
+        if pixels > self.config["max_pixels"]:
+            self._reject(
+                "too_many_pixels",
+                f"Image is {width}x{height}; the limit is "
+                f"{self.config['max_pixels'] / 1e6:.0f} megapixels",
+            )
+        if max(width, height) / min(width, height) > self.config["max_aspect_ratio"]:
+            self._reject("aspect_ratio", f"Image is {width}x{height}")
+
+        scale = next(
+            (s for s in REDUCED_FLAGS if pixels / s**2 <= self.pixel_budget), 8
+        )
+        decoded_pixels = pixels // scale**2
+        return {
+            "format": image_format,
+            "width": width,
+            "height": height,
+            "scale": scale,
+            "bytes": decoded_pixels * 3 * self.config["working_copies"],
+        }
+
+    def _pdf_plan(self):
+        # Pages are rasterized within pixel_budget; pdf.pages_in_flight of
+        # them are held at once, which the pipeline bounds separately
+        return {
+            "format": "PDF",
+            "bytes": self.pixel_budget * 3 * self.config["working_copies"],
+        }
+
+    def _reject(self, reason, message):
+        metrics.incr("ingest_images_total", outcome="rejected", reason=reason)
+        logger.warning(f"Rejected document ({reason}): {message}")
+        raise ImageRejected(message)
+
+
+class MemoryBudget:
+    """
+    Process-wide budget of bytes held by documents being processed. Callers
+    wait until their document fits, so a few huge scans are worked on one
+    after another instead of all at once. A document larger than the whole
+    budget still runs, alone.
+    """
+
+    def __init__(self, limit_bytes):
+        self.limit = limit_bytes
+        self.in_use = 0
+        self._lock = threading.Lock()
+
+    def try_acquire(self, size):
+        with self._lock:
+            if self.in_use and self.in_use + size > self.limit:
+                return False
+            self.in_use += size
+            return True
+
+    async def acquire(self, size, poll_interval=0.05):
+        # Polled rather than a Condition: callers run on several event loops
+        # (API, sync wrappers), and a cancelled waiter never holds budget
+        waited = False
+        while not self.try_acquire(size):
+            waited = True
+            await asyncio.sleep(poll_interval)
+        if waited:
+            metrics.incr("ingest_memory_budget_waits_total")
+
+    def release(self, size):
+        with self._lock:
+            self.in_use -= size
@@ -0,0 +1,67 @@
+import json
+
+import json5
+
+
+class JSONObjectScanner:
+    """
+    Incrementally scans streamed LLM output for the first top-level JSON
+    object, tracking brace depth and string literals (single or double
+    quoted, as JSON5 allows) so braces inside values are ignored.
+
+    `feed` returns True once the object is closed; anything the model writes
+    after that can be dropped without reading it.
+    """
+
+    def __init__(self):
+        self._parts = []
+        self._depth = 0
+        self._quote = None
+        self._escaped = False
+        self.started = False
+        self.complete = False
+
+    def feed(self, text):
+        if self.complete:
+            return True
+        start = 0
+        if not self.started:
+            start = text.find("{")
+            if start < 0:
+                return False
+            self.started = True
+
+        for i in range(start, len(text)):
+            char = text[i]
+            if self._quote:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == self._quote:
+                    self._quote = None
+            elif char in "\"'":
+                self._quote = char
+            elif char == "{":
+                self._depth += 1
+            elif char == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._parts.append(text[start : i + 1])
+                    self.complete = True
+                    return True
+
+        self._parts.append(text[start:])
+        return False
+
+    @property
+    def text(self):
+        return "".join(self._parts)
+
+
+def loads(json_str):
+    """Parse with the C-accelerated stdlib json first, json5 only if that fails."""
+    try:
+        return json.loads(json_str)
+    except ValueError:
+        return json5.loads(json_str)
@@ -0,0 +1,131 @@
+import glob
+import logging
+import os
+
+import cv2
+import numpy as np
+import yaml
+
+logger = logging.getLogger(__name__)
+
+# Long side, in pixels, of the images ORB features are computed on
+ALIGN_SIDE = 1000
+ORB_FEATURES = 2000
+
+
+def _to_gray(img):
+    return img if img.ndim == 2 else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+
+
+def _downscale(img, side=ALIGN_SIDE):
+    scale = min(1.0, side / max(img.shape[:2]))
+    if scale == 1.0:
+        return img, scale
+    small = cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    return small, scale
+
+
+def crop(img, box):
+    """Crop a [left, top, right, bottom] box given as fractions of the image size."""
+    height, width = img.shape[:2]
+    left, top, right, bottom = box
+    return img[
+        int(top * height) : int(bottom * height),
+        int(left * width) : int(right * width),
+    ]
+
+
+class LayoutTemplate:
+    """
+    Fixed layout of one board's certificate or marksheet: where each field
+    sits on the page, and how to recognise the layout, either by aligning
+    to a reference scan (ORB features + homography) or by keywords in a
+    header region.
+    """
+
+    def __init__(self, path):
+        with open(path) as f:
+            spec = yaml.safe_load(f)
+        self.path = path
+        self.name = spec.get("name") or os.path.splitext(os.path.basename(path))[0]
+        self.doc_types = spec["doc_types"]
+        self.fields = spec["fields"]
+        self.keywords = [k.lower() for k in spec.get("keywords", [])]
+        self.match_region = spec.get("match_region", [0.0, 0.0, 1.0, 0.25])
+        self.min_matches = spec.get("min_matches", 40)
+
+        self.reference_size = None
+        if spec.get("reference_image"):
+            reference_path = os.path.join(
+                os.path.dirname(path), spec["reference_image"]
+            )
+            reference = cv2.imread(reference_path, cv2.IMREAD_GRAYSCALE)
+            if reference is None:
+                raise ValueError(f"Cannot read reference image {reference_path}")
+            self.reference_size = (reference.shape[1], reference.shape[0])
+            small, self._reference_scale = _downscale(reference)
+            orb = cv2.ORB_create(nfeatures=ORB_FEATURES)
+            self._reference_features = orb.detectAndCompute(small, None)
+        elif not self.keywords:
+            raise ValueError("Template needs a reference_image or keywords")
+
+    def align(self, img):
+        """
+        Warp a page onto the reference layout.
+
+        Returns:
+            numpy.ndarray or None: The aligned page, or None if the page does
+            not match the reference.
+        """
+        small, scale = _downscale(_to_gray(img))
+        # ORB detectors are not shared: pages are aligned on several threads
+        orb = cv2.ORB_create(nfeatures=ORB_FEATURES)
+        keypoints, descriptors = orb.detectAndCompute(small, None)
+        ref_keypoints, ref_descriptors = self._reference_features
+        if descriptors is None or ref_descriptors is None:
+            return None
+
+        matcher = cv2.BFMatcher(cv2.NORM_HAMMING, crossCheck=True)
+        matches = matcher.match(descriptors, ref_descriptors)
+        if len(matches) < self.min_matches:
+            return None
+
+        src = np.float32([keypoints[m.queryIdx].pt for m in matches]) / scale
+        dst = np.float32([ref_keypoints[m.trainIdx].pt for m in matches])
+        dst /= self._reference_scale
+        homography, inliers = cv2.findHomography(src, dst, cv2.RANSAC, 5.0)
+        if homography is None or int(inliers.sum()) < self.min_matches:
+            return None
+        return cv2.warpPerspective(
+            img, homography, self.reference_size, borderValue=(255, 255, 255)
+        )
+
+    def matches_text(self, text):
+        text = text.lower()
+        return all(keyword in text for keyword in self.keywords)
+
+
+class TemplateMatcher:
+    """
+    Layout templates loaded from the YAML files of a directory. Files whose
+    name starts with "_" (such as the shipped example) are skipped.
+    """
+
+    def __init__(self, directory):
+        self.templates = {}
+        for path in sorted(glob.glob(os.path.join(directory, "*.yaml"))):
+            if os.path.basename(path).startswith("_"):
+                continue
+            try:
+                template = LayoutTemplate(path)
+            except Exception as e:
+                logger.error(f"Skipping layout template {path}: {str(e)}")
+                continue
+            for doc_type in template.doc_types:
+                self.templates.setdefault(doc_type, []).append(template)
+        logger.info(
+            f"Loaded layout templates for {sorted(self.templates) or 'no doc_types'}"
+        )
+
+    def candidates(self, doc_type):
+        return self.templates.get(doc_type, [])
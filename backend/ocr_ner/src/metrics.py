@@ -0,0 +1,134 @@
+import bisect
+import threading
+from collections import defaultdict
+
+# Upper bounds, in ms, of the latency histogram buckets
+LATENCY_BUCKETS_MS = (
+    5,
+    10,
+    25,
+    50,
+    100,
+    250,
+    500,
+    1000,
+    2500,
+    5000,
+    10000,
+    30000,
+    60000,
+    120000,
+)
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the style of Prometheus."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """Estimate a quantile by linear interpolation within its bucket."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = self.buckets[i - 1] if i else 0
+                upper = self.buckets[i] if i < len(self.buckets) else lower
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 2),
+            "p50": _round(self.quantile(0.5)),
+            "p95": _round(self.quantile(0.95)),
+            "buckets": {
+                str(bound): sum(self.counts[: i + 1])
+                for i, bound in enumerate(self.buckets)
+            },
+        }
+
+
+def _round(value):
+    return None if value is None else round(value, 2)
+
+
+class Metrics:
+    """
+    Thread-safe in-process counters and histograms, keyed by metric name and
+    labels.
+
+    Snapshots flatten each series to a Prometheus-style key such as
+    `extraction_cache_hits_total{doc_type="aadhaar"}`.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(float)
+        self._histograms = defaultdict(Histogram)
+
+    @staticmethod
+    def _key(name, labels):
+        if not labels:
+            return name
+        label_str = ",".join(f'{k}="{v}"' for k, v in sorted(labels.items()))
+        return f"{name}{{{label_str}}}"
+
+    def incr(self, name, value=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] += value
+
+    def observe(self, name, value, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._histograms[key].observe(value)
+
+    def get(self, name, **labels):
+        with self._lock:
+            return self._counters.get(self._key(name, labels), 0)
+
+    def share(self, name, **labels):
+        """
+        Fraction of the series of `name` carrying all of `labels`, e.g. the
+        fallback rate of a counter labelled by outcome.
+        """
+        matched, total = 0, 0
+        wanted = [f'{k}="{v}"' for k, v in labels.items()]
+        with self._lock:
+            for key, value in self._counters.items():
+                if key != name and not key.startswith(f"{name}{{"):
+                    continue
+                total += value
+                if all(label in key for label in wanted):
+                    matched += value
+        return matched / total if total else 0.0
+
+    def histograms(self, name=None):
+        with self._lock:
+            return {
+                key: histogram.summary()
+                for key, histogram in self._histograms.items()
+                if name is None or key == name or key.startswith(f"{name}{{")
+            }
+
+    def snapshot(self):
+        with self._lock:
+            counters = dict(self._counters)
+        return {"counters": counters, "histograms": self.histograms()}
+
+
+metrics = Metrics()
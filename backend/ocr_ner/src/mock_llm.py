@@ -0,0 +1,206 @@
+"""
+Stand-in for the LLM endpoint, speaking the streaming chat-completions protocol
+NERProcessor uses, so the pipeline can be benchmarked and load-tested offline.
+
+Point `ner.base_url` at the server to use it; behaviour is set by the
+`mock_llm` section of config.yaml.
+"""
+
+import asyncio
+import json
+import os
+import random
+import re
+import threading
+import time
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+DEFAULT_SETTINGS = {
+    "host": "127.0.0.1",
+    "port": 8089,
+    # Generation speed per request once the first token is out
+    "tokens_per_second": 40,
+    "ttft_ms": 300,
+    # Prompt processing speed, added to ttft_ms; 0 makes TTFT independent of prompts
+    "prefill_tokens_per_second": 0,
+    # Fraction of requests answered with HTTP 503
+    "error_rate": 0.0,
+    # Requests generating at once; the rest queue, like a real server's batch slots
+    "max_concurrent": 8,
+    # Chatter streamed after the JSON, as real models often do
+    "trailing_tokens": 0,
+    # Canned JSON reply per doc_type; missing doc_types get a placeholder per field
+    "replies": {},
+}
+
+TOKEN_PATTERN = re.compile(r"\s*[^\s]{1,4}")
+# Instruction NERProcessor appends when rules already filled some fields
+ONLY_KEYS_PATTERN = re.compile(r"Only return these keys: (.+)\.\s*$")
+
+
+def tokenize(text):
+    """Split text into small chunks, roughly the size of LLM tokens."""
+    return TOKEN_PATTERN.findall(text) or [text]
+
+
+class MockLLM:
+    def __init__(self, config, config_dir=""):
+        """
+        Args:
+            config (dict): The parsed config.yaml.
+            config_dir (str): Directory that relative prompt paths resolve against.
+        """
+        self.settings = {**DEFAULT_SETTINGS, **config.get("mock_llm", {})}
+        self.replies = {}
+        self.prompt_prefixes = {}
+        for doc_type, doc_config in config["doc_types"].items():
+            reply = self.settings["replies"].get(doc_type) or {
+                field: f"sample {field}" for field in doc_config["fields"]
+            }
+            self.replies[doc_type] = reply
+            prompt_path = os.path.join(config_dir, doc_config["prompt"])
+            with open(prompt_path, "r") as f:
+                self.prompt_prefixes[doc_type] = f.read().strip().split("{text}")[0]
+        self._semaphore = None
+
+    def doc_type_for(self, system_prompt):
+        """Recognise the doc_type from the prompt template the system prompt uses."""
+        for doc_type, prefix in self.prompt_prefixes.items():
+            if prefix and system_prompt.startswith(prefix):
+                return doc_type
+        return None
+
+    def reply_for(self, messages):
+        system_prompt = next(
+            (m["content"] for m in messages if m.get("role") == "system"), ""
+        )
+        reply = self.replies.get(self.doc_type_for(system_prompt), {})
+        only_keys = ONLY_KEYS_PATTERN.search(system_prompt)
+        if only_keys:
+            keys = re.findall(r'"([^"]+)"', only_keys.group(1))
+            reply = {key: value for key, value in reply.items() if key in keys}
+        reply = json.dumps(reply, indent=2)
+        trailing = " Let me know if you need anything else." * (
+            self.settings["trailing_tokens"] // 8 + 1
+        )
+        tokens = tokenize(reply)
+        if self.settings["trailing_tokens"]:
+            tokens += tokenize(trailing)[: self.settings["trailing_tokens"]]
+        return tokens
+
+    def ttft_seconds(self, messages):
+        ttft = self.settings["ttft_ms"] / 1000
+        if self.settings["prefill_tokens_per_second"]:
+            prompt = "".join(m.get("content") or "" for m in messages)
+            ttft += len(tokenize(prompt)) / self.settings["prefill_tokens_per_second"]
+        return ttft
+
+    async def stream(self, model, tokens, max_tokens, ttft=None):
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+        interval = 1 / self.settings["tokens_per_second"]
+
+        def event(delta, finish_reason=None):
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [
+                    {"index": 0, "delta": delta, "finish_reason": finish_reason}
+                ],
+            }
+            return f"data: {json.dumps(chunk)}\n\n"
+
+        async with self._slots():
+            if ttft is None:
+                ttft = self.settings["ttft_ms"] / 1000
+            await asyncio.sleep(ttft)
+            tokens = tokens[:max_tokens] if max_tokens else tokens
+            for i, token in enumerate(tokens):
+                if i:
+                    await asyncio.sleep(interval)
+                delta = {"content": token}
+                if i == 0:
+                    delta["role"] = "assistant"
+                yield event(delta)
+            finish_reason = "length" if max_tokens == len(tokens) else "stop"
+            yield event({}, finish_reason)
+            yield "data: [DONE]\n\n"
+
+    def _slots(self):
+        # Created lazily so the semaphore belongs to the server's event loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.settings["max_concurrent"])
+        return self._semaphore
+
+
+def create_app(config, config_dir=""):
+    mock = MockLLM(config, config_dir)
+    app = FastAPI(title="Mock LLM")
+    app.state.mock = mock
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        if random.random() < mock.settings["error_rate"]:
+            return JSONResponse(
+                status_code=503, content={"error": "Mock LLM injected failure"}
+            )
+
+        messages = body.get("messages", [])
+        tokens = mock.reply_for(messages)
+        ttft = mock.ttft_seconds(messages)
+        model = body.get("model") or "mock-llm"
+        max_tokens = body.get("max_tokens")
+        if body.get("stream"):
+            return StreamingResponse(
+                mock.stream(model, tokens, max_tokens, ttft),
+                media_type="text/event-stream",
+            )
+
+        # Non-streaming requests still pay the simulated generation time
+        async for _ in mock.stream(model, tokens, max_tokens, ttft):
+            pass
+        content = "".join(tokens[:max_tokens] if max_tokens else tokens)
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }
+            ],
+        }
+
+    return app
+
+
+def start_in_thread(config, config_dir="", host=None, port=None):
+    """
+    Serve the mock in a daemon thread, for benchmarks and tests in one process.
+    Returns the uvicorn server; set `server.should_exit = True` to stop it.
+    """
+    import uvicorn
+
+    settings = {**DEFAULT_SETTINGS, **config.get("mock_llm", {})}
+    server = uvicorn.Server(
+        uvicorn.Config(
+            create_app(config, config_dir),
+            host=host or settings["host"],
+            port=port or settings["port"],
+            log_level="warning",
+        )
+    )
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started and thread.is_alive():
+        time.sleep(0.05)
+    return server
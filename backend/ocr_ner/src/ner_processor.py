@@ -1,13 +1,83 @@
+import asyncio
+import logging
 import os
-import json5
-from huggingface_hub import InferenceClient
+import time
+import weakref
+from huggingface_hub import AsyncInferenceClient
+
+from .json_stream import JSONObjectScanner, loads
+from .metrics import metrics
+from . import timing
+from .rule_extractor import RuleExtractor, valid_format
+from .text_compactor import TextCompactor, estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# asyncio semaphores belong to one event loop, so limits are kept per loop and
+# shared by every NERProcessor running on it
+_loop_limiters = weakref.WeakKeyDictionary()
+
+# What LLMs write for a field they could not find
+PLACEHOLDERS = {
+    "",
+    "-",
+    "na",
+    "n/a",
+    "nil",
+    "none",
+    "null",
+    "unknown",
+    "not found",
+    "not available",
+    "not mentioned",
+    "not specified",
+}
+
+FOLLOWUP_DEFAULTS = {
+    "enabled": True,
+    # The answer only holds a few keys
+    "max_new_tokens": 256,
+    # Per-doc_type fields often absent from the document itself; not asked for
+    # again when missing (they still are when invalid)
+    "optional": {},
+}
 
 
 class NERProcessor:
     def __init__(self, config):
         self.config = config["ner"]
-        self.client = InferenceClient(api_key=os.getenv("HUGGINGFACEHUB_API_TOKEN"))
+        api_key = os.getenv("HUGGINGFACEHUB_API_TOKEN")
+        # base_url points at a dedicated or local OpenAI-compatible endpoint;
+        # without it the model is served by the Hugging Face Inference API
+        base_url = self.config.get("base_url")
+        self.endpoint = base_url or self.config["llm_model"]
+        # One client per processor, shared by every concurrent request; it
+        # holds the endpoint and credentials, while huggingface_hub opens an
+        # HTTP session per call
+        self.async_client = AsyncInferenceClient(base_url=base_url, api_key=api_key)
         self.prompt_templates = self._load_prompt_templates(config["doc_types"])
+        # Fields with tight formats are read by rules; the LLM gets the rest
+        self.rules = RuleExtractor(config["doc_types"])
+        self.fields = {
+            doc_type: doc_config["fields"]
+            for doc_type, doc_config in config["doc_types"].items()
+        }
+        # OCR text is cleaned up and fitted to a token budget for the prompt
+        self.compactor = TextCompactor(
+            self.config.get("compaction"), config["doc_types"]
+        )
+        # Fields missing or invalid after extraction are asked for once more,
+        # on their own, in a short follow-up prompt
+        self.followup = {**FOLLOWUP_DEFAULTS, **(self.config.get("followup") or {})}
+
+        concurrency = self.config.get("concurrency", {})
+        self.global_limit = concurrency.get("global", 8)
+        self.endpoint_limit = concurrency.get("endpoints", {}).get(
+            self.endpoint, concurrency.get("per_endpoint", 4)
+        )
+        # Close the stream once the top-level JSON object is complete instead
+        # of reading whatever the model writes after it
+        self.stop_at_json_end = self.config.get("stop_at_json_end", True)
 
     def _load_prompt_templates(self, doc_types_config):
         templates = {}
@@ -16,36 +86,326 @@ class NERProcessor:
                 templates[doc_type] = f.read().strip()
         return templates
 
-    def extract_entities(self, text, doc_type):
+    def _build_messages(self, text, doc_type, only_fields=None):
+        prompt_template = self.prompt_templates[doc_type]
+        # Templates may place the OCR text with {text}; otherwise it is the
+        # user message
+        if "{text}" in prompt_template:
+            system_prompt, user_content = prompt_template.format(text=text), ""
+        else:
+            system_prompt, user_content = prompt_template, text
+        if only_fields:
+            keys = ", ".join(f'"{field}"' for field in only_fields)
+            system_prompt += f"\n\nOnly return these keys: {keys}."
+
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_content},
+        ]
+
+    def _prompt_text(self, text, doc_type, lines):
+        compacted, report = self.compactor.compact(text, doc_type, lines)
+        if report is not None:
+            dropped = {k: v for k, v in report.items() if not k.startswith("tokens")}
+            logger.info(
+                f"{doc_type} OCR text compacted from {report['tokens_before']} to "
+                f"{report['tokens_after']} tokens; lines dropped: {dropped}"
+            )
+        return compacted
+
+    def _prefill(self, text, doc_type, lines=None):
+        """
+        Run the doc_type's rules over the text.
+
+        Returns:
+            tuple: (fields filled by rules, fields left for the LLM). The LLM
+            call can be skipped when nothing is left.
+        """
+        prefilled = self.rules.extract(text, doc_type)
+        for field in prefilled:
+            metrics.incr("ner_rule_fields_total", doc_type=doc_type, field=field)
+        remaining = [f for f in self.fields.get(doc_type, []) if f not in prefilled]
+        if prefilled and not remaining:
+            # The prompt that would have been sent, compacted as it would be
+            compacted, _ = self.compactor.compact(text, doc_type, lines)
+            messages = self._build_messages(compacted, doc_type)
+            prompt = "".join(message["content"] for message in messages)
+            metrics.incr("ner_llm_calls_avoided_total", doc_type=doc_type)
+            metrics.incr(
+                "ner_prompt_tokens_saved_total",
+                estimate_tokens(prompt),
+                doc_type=doc_type,
+            )
+            logger.info(f"All {doc_type} fields matched by rules; LLM call skipped")
+        return prefilled, remaining
+
+    def _merge(self, prefilled, entities):
+        # Rule values are exact matches, so they win over the LLM's
+        if not prefilled or not isinstance(entities, dict) or "error" in entities:
+            return entities
+        return {**entities, **prefilled}
+
+    def _limiters(self):
+        limiters = _loop_limiters.setdefault(asyncio.get_running_loop(), {})
+        if "global" not in limiters:
+            limiters["global"] = asyncio.Semaphore(self.global_limit)
+        if self.endpoint not in limiters:
+            limiters[self.endpoint] = asyncio.Semaphore(self.endpoint_limit)
+        return limiters[self.endpoint], limiters["global"]
+
+    def extract_entities(self, text, doc_type, lines=None):
+        """Synchronous wrapper around aextract_entities for threads and scripts."""
+        return asyncio.run(self.aextract_entities(text, doc_type, lines))
+
+    async def aextract_entities(self, text, doc_type, lines=None, followup=True):
+        """
+        Extract the doc_type's entities from OCR text.
+
+        Rules run over the full text; the LLM prompt gets the compacted text,
+        built from the OCR lines (with their confidence) when given. At most
+        ner.concurrency.global calls run at once in the process, and at most
+        the endpoint's limit against any one endpoint.
+
+        Args:
+            followup (bool): Ask again for missing or invalid fields. Off for
+                parts of a document, e.g. PDF pages, whose merged entities get
+                one follow-up through afollow_up instead.
+        """
+        with timing.span("ner"):
+            return await self._aextract_entities(text, doc_type, lines, followup)
+
+    async def afollow_up(self, text, doc_type, entities, lines=None):
+        """
+        Ask once for the fields entities lack or give in an invalid format,
+        over the whole text; every field when entities is an error.
+
+        Returns:
+            dict: The entities with the recovered fields filled in.
+        """
+        fields = self._followup_fields(entities, doc_type, {})
+        if not fields:
+            return entities
+        with timing.span("ner"):
+            prompt_text = self._prompt_text(text, doc_type, lines)
+            answers = await self._aextract_fields(prompt_text, doc_type, fields)
+        return self._apply_followup(entities, answers, fields, doc_type)
+
+    async def _aextract_entities(self, text, doc_type, lines, followup=True):
+        prefilled, remaining = self._prefill(text, doc_type, lines)
+        if prefilled and not remaining:
+            return prefilled
         try:
-            prompt_template = self.prompt_templates[doc_type]
-            system_prompt = prompt_template.format(text=text)
+            prompt_text = self._prompt_text(text, doc_type, lines)
+            messages = self._build_messages(
+                prompt_text, doc_type, remaining if prefilled else None
+            )
+            output_text = await self._acomplete(messages, doc_type)
+        except Exception as e:
+            return {"error": str(e)}
 
-            messages = [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": ""},
-            ]
+        entities = self._parse_output(output_text)
+        fields = followup and self._followup_fields(entities, doc_type, prefilled)
+        if fields:
+            answers = await self._aextract_fields(prompt_text, doc_type, fields)
+            entities = self._apply_followup(entities, answers, fields, doc_type)
+        return self._merge(prefilled, entities)
 
-            stream = self.client.chat.completions.create(
+    async def _acomplete(self, messages, doc_type, max_tokens=None):
+        """Stream one completion within the concurrency limits; returns its text."""
+        # Take the endpoint slot first so waiting on a busy endpoint
+        # does not hold a global slot
+        endpoint_limit, global_limit = self._limiters()
+        wait_start = time.perf_counter()
+        async with endpoint_limit, global_limit:
+            wait_ms = (time.perf_counter() - wait_start) * 1000
+            timing.record("ner_wait", wait_ms)
+            stats = self._new_stream_stats(max_tokens)
+            stream = await self.async_client.chat.completions.create(
                 model=self.config["llm_model"],
                 messages=messages,
                 temperature=self.config["temperature"],
-                max_tokens=self.config["max_new_tokens"],
+                max_tokens=stats["max_tokens"],
                 stream=True,
             )
+            return await self._acollect_stream_output(stream, doc_type, stats)
+
+    def extract_fields(self, text, doc_type, fields, lines=None):
+        """Synchronous wrapper around aextract_fields for threads and scripts."""
+        return asyncio.run(self.aextract_fields(text, doc_type, fields, lines))
 
-            output_text = self._collect_stream_output(stream)
-            return self._parse_output(output_text)
+    async def aextract_fields(self, text, doc_type, fields, lines=None):
+        """
+        Ask the LLM for only some of the doc_type's fields, e.g. those missing
+        from a stored extraction. The prompt is the doc_type's own, limited to
+        the fields, with a small output budget.
 
+        Returns:
+            dict: The parsed answer, or a dict with an 'error' key.
+        """
+        with timing.span("ner"):
+            prompt_text = self._prompt_text(text, doc_type, lines)
+            return await self._aextract_fields(prompt_text, doc_type, fields)
+
+    async def _aextract_fields(self, prompt_text, doc_type, fields):
+        messages = self._build_messages(prompt_text, doc_type, list(fields))
+        try:
+            with timing.span("ner_followup"):
+                output_text = await self._acomplete(
+                    messages, doc_type, self.followup["max_new_tokens"]
+                )
         except Exception as e:
             return {"error": str(e)}
+        return self._parse_output(output_text)
+
+    def field_problem(self, field, value):
+        """
+        "missing" for an absent, empty or placeholder value, "invalid" for one
+        that cannot be right (a list, an impossible date), else None.
+        """
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            value = str(value)
+        if value is None or (
+            isinstance(value, str) and value.strip().lower() in PLACEHOLDERS
+        ):
+            return "missing"
+        if not isinstance(value, str) or not valid_format(field, value):
+            return "invalid"
+        return None
+
+    def incomplete_fields(self, entities, doc_type):
+        """
+        Check entities against the doc_type's configured fields.
+
+        Returns:
+            dict: {field: "missing" | "invalid"}; every field when the entities
+            are an error.
+        """
+        fields = self.fields.get(doc_type, [])
+        if not isinstance(entities, dict) or "error" in entities:
+            return {field: "missing" for field in fields}
+        problems = {}
+        for field in fields:
+            problem = self.field_problem(field, entities.get(field))
+            if problem:
+                problems[field] = problem
+        return problems
+
+    def _followup_fields(self, entities, doc_type, prefilled):
+        """Fields worth a follow-up prompt; all of the LLM's after a parse error."""
+        if not self.followup["enabled"]:
+            return {}
+        optional = self.followup["optional"].get(doc_type, [])
+        failed = not isinstance(entities, dict) or "error" in entities
+        return {
+            field: problem
+            for field, problem in self.incomplete_fields(entities, doc_type).items()
+            if field not in prefilled
+            and (failed or problem == "invalid" or field not in optional)
+        }
+
+    def _apply_followup(self, entities, answers, fields, doc_type):
+        """Take the follow-up's usable answers; anything else stays as it was."""
+        metrics.incr("ner_followup_calls_total", doc_type=doc_type)
+        if not isinstance(answers, dict):
+            answers = {
+                "error": f"Expected a JSON object, got {type(answers).__name__}"
+            }
+        if "error" in answers:
+            logger.warning(f"{doc_type} follow-up failed: {answers['error']}")
+            metrics.incr(
+                "ner_followup_fields_total",
+                len(fields),
+                doc_type=doc_type,
+                outcome="unresolved",
+            )
+            return entities
+
+        recovered = {
+            field: answers[field]
+            for field in fields
+            if self.field_problem(field, answers.get(field)) is None
+        }
+        unresolved = [field for field in fields if field not in recovered]
+        logger.info(
+            f"{doc_type} follow-up for {dict(fields)}: recovered {list(recovered)}, "
+            f"unresolved {unresolved}"
+        )
+        metrics.incr(
+            "ner_followup_fields_total",
+            len(recovered),
+            doc_type=doc_type,
+            outcome="recovered",
+        )
+        metrics.incr(
+            "ner_followup_fields_total",
+            len(unresolved),
+            doc_type=doc_type,
+            outcome="unresolved",
+        )
+        if not isinstance(entities, dict) or "error" in entities:
+            # The first answer was unreadable: the follow-up's is the answer
+            return {field: answers.get(field) for field in fields}
+        return {**entities, **recovered}
+
+    async def _acollect_stream_output(self, stream, doc_type, stats=None):
+        scanner, stats = JSONObjectScanner(), stats or self._new_stream_stats()
+        try:
+            async for chunk in stream:
+                if self._feed(scanner, chunk, stats):
+                    break
+        finally:
+            await stream.aclose()
+        self._report_stream(scanner, stats, doc_type)
+        return scanner.text if scanner.complete else "".join(stats["chunks"])
+
+    def _new_stream_stats(self, max_tokens=None):
+        # Started just before the request so time to first token includes it
+        return {
+            "start": time.perf_counter(),
+            # The stream's own cap, which bounds the tokens early stops save
+            "max_tokens": max_tokens or self.config["max_new_tokens"],
+            "first_token": None,
+            "tokens": 0,
+            "chunks": [],
+        }
+
+    def _feed(self, scanner, chunk, stats):
+        """Record one streamed chunk; True when the stream can be closed."""
+        # Role-only and empty chunks carry no generated token
+        if not (chunk.choices and chunk.choices[0].delta.content):
+            return False
+        stats["tokens"] += 1
+        if stats["first_token"] is None:
+            stats["first_token"] = time.perf_counter()
+        content = chunk.choices[0].delta.content
+        stats["chunks"].append(content)
+        return scanner.feed(content) and self.stop_at_json_end
 
-    def _collect_stream_output(self, stream):
-        output_text = ""
-        for chunk in stream:
-            if chunk.choices and chunk.choices[0].delta.content:
-                output_text += chunk.choices[0].delta.content
-        return output_text
+    def _report_stream(self, scanner, stats, doc_type):
+        # Each streamed chunk carries one generated token. Unread tokens are
+        # bounded by the stream's max_tokens, and their time is estimated from the
+        # mean inter-token latency after the first token.
+        tokens = stats["tokens"]
+        now = time.perf_counter()
+        elapsed_ms = (now - stats["start"]) * 1000
+        metrics.incr("ner_stream_tokens_total", tokens, doc_type=doc_type)
+        if stats["first_token"] is not None:
+            timing.record("ner_ttft", (stats["first_token"] - stats["start"]) * 1000)
+        if not (scanner.complete and self.stop_at_json_end):
+            return
+        tokens_saved = max(stats["max_tokens"] - tokens, 0)
+        ms_saved = 0.0
+        if tokens > 1:
+            decode_ms = (now - stats["first_token"]) * 1000
+            ms_saved = tokens_saved * decode_ms / (tokens - 1)
+        metrics.incr("ner_early_stops_total", doc_type=doc_type)
+        metrics.incr("ner_tokens_saved_total", tokens_saved, doc_type=doc_type)
+        metrics.incr("ner_ms_saved_total", round(ms_saved, 1), doc_type=doc_type)
+        logger.info(
+            f"NER stream for {doc_type} closed after {tokens} tokens "
+            f"({elapsed_ms:.0f} ms); saved up to {tokens_saved} tokens, "
+            f"~{ms_saved:.0f} ms"
+        )
 
     def _parse_output(self, output_text):
         try:
@@ -57,8 +417,8 @@ class NERProcessor:
             # Remove any markdown code blocks and whitespace
             json_str = json_str.replace('```json', '').replace('```', '').strip()
 
-            # Use JSON5 parser which is more lenient
-            return json5.loads(json_str)
+            # Strict JSON parses natively; JSON5 is the lenient fallback
+            return loads(json_str)
 
         except Exception as e:
             return {
@@ -0,0 +1,92 @@
+import importlib.util
+import os
+
+# ONNX Runtime execution providers of the ONNX backends, in preference order;
+# operators the first provider cannot run fall back to the next
+ONNX_PROVIDERS = {
+    "onnxruntime": ["CPUExecutionProvider"],
+    "openvino": ["OpenVINOExecutionProvider", "CPUExecutionProvider"],
+}
+BACKENDS = ["paddle", "mkldnn", *ONNX_PROVIDERS]
+
+DEFAULTS = {
+    "name": "paddle",
+    # Backend loaded instead when the configured one cannot run here; null
+    # to fail instead
+    "fallback": "paddle",
+    # MKLDNN caches compiled kernels per input shape; page sizes vary, so
+    # bound the cache or it grows with every new shape
+    "mkldnn_cache_capacity": 10,
+    # The PaddleOCR det/rec/cls models converted with paddle2onnx
+    "onnx_models": {
+        "det": "models/onnx/det.onnx",
+        "rec": "models/onnx/rec.onnx",
+        "cls": "models/onnx/cls.onnx",
+    },
+}
+
+
+class OCRBackendUnavailable(RuntimeError):
+    """The OCR backend cannot run here: unknown, not installed or no models."""
+
+
+def backend_config(config=None):
+    config = {**DEFAULTS, **(config or {})}
+    config["onnx_models"] = {**DEFAULTS["onnx_models"], **config["onnx_models"]}
+    return config
+
+
+def paddleocr_kwargs(name, config, cpu_threads):
+    """
+    PaddleOCR keyword arguments that run the same models on another backend.
+
+    Args:
+        name (str): One of BACKENDS.
+        config (dict): Backend settings, as returned by backend_config.
+        cpu_threads (int): Intra-op threads for ONNX Runtime sessions.
+
+    Raises:
+        OCRBackendUnavailable: If the backend cannot run in this environment.
+    """
+    if name not in BACKENDS:
+        raise OCRBackendUnavailable(f"Unknown OCR backend {name}")
+    if name == "paddle":
+        return {"enable_mkldnn": False}
+    if name == "mkldnn":
+        return {
+            "enable_mkldnn": True,
+            "mkldnn_cache_capacity": config["mkldnn_cache_capacity"],
+        }
+
+    if importlib.util.find_spec("onnxruntime") is None:
+        raise OCRBackendUnavailable(f"{name} needs the onnxruntime package")
+    import onnxruntime as ort
+
+    providers = ONNX_PROVIDERS[name]
+    if providers[0] not in ort.get_available_providers():
+        raise OCRBackendUnavailable(
+            f"{providers[0]} is not available in this onnxruntime build"
+        )
+    models = {}
+    for part, path in config["onnx_models"].items():
+        if not os.path.isfile(path):
+            raise OCRBackendUnavailable(
+                f"No {part} ONNX model at {path}; convert it with paddle2onnx"
+            )
+        models[f"{part}_model_dir"] = path
+
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = cpu_threads
+    return {
+        "use_onnx": True,
+        "onnx_providers": providers,
+        "onnx_sess_options": options,
+        **models,
+    }
+
+
+def active_providers(ocr):
+    """Execution providers the detector session really uses, for ONNX backends."""
+    predictor = getattr(getattr(ocr, "text_detector", None), "predictor", None)
+    get_providers = getattr(predictor, "get_providers", None)
+    return get_providers() if get_providers else []
@@ -1,29 +1,316 @@
 from paddleocr import PaddleOCR
+from paddleocr.tools.infer.predict_system import sorted_boxes
+from paddleocr.tools.infer.utility import get_rotate_crop_image
+import cv2
+import json
+import logging
 import numpy as np
 import os
+import threading
+
+from .ocr_backends import (
+    ONNX_PROVIDERS,
+    OCRBackendUnavailable,
+    active_providers,
+    backend_config,
+    paddleocr_kwargs,
+)
+
+logger = logging.getLogger(__name__)
+
+ORIENTATION_DEFAULTS = {
+    # page: one check per page on a downscaled copy, rotate once, and classify
+    # each text line only when the check is ambiguous
+    # line: classify the angle of every text line
+    # none: assume pages are upright
+    "mode": "page",
+    # Long side, in pixels, of the copy the page check runs on
+    "check_side": 960,
+    # Largest text lines recognised to score an orientation
+    "sample_lines": 5,
+    # Mean confidence at which an upright reading is accepted without trying 180°
+    "upright_confidence": 0.85,
+    # Orientations closer than this in mean confidence are ambiguous
+    "margin": 0.1,
+}
+
+# cv2.rotate code that turns the page upright, by (vertical lines, flipped);
+# PaddleOCR's crop helper already turns tall line crops 90° counter-clockwise
+PAGE_ROTATIONS = {
+    (False, False): None,
+    (False, True): cv2.ROTATE_180,
+    (True, False): cv2.ROTATE_90_COUNTERCLOCKWISE,
+    (True, True): cv2.ROTATE_90_CLOCKWISE,
+}
+# PaddleOCR settings an OCR profile may set on top of the common ones;
+# unset ones keep PaddleOCR's defaults
+PROFILE_PARAMS = (
+    "ocr_version",
+    "det_model_dir",
+    "rec_model_dir",
+    "cls_model_dir",
+    "rec_char_dict_path",
+    "det_limit_side_len",
+    "det_limit_type",
+)
+
+ROTATION_DEGREES = {
+    None: 0,
+    cv2.ROTATE_90_CLOCKWISE: 90,
+    cv2.ROTATE_180: 180,
+    cv2.ROTATE_90_COUNTERCLOCKWISE: 270,
+}
+
+
+def resolve_profiles(ocr_config, doc_types_config):
+    """
+    Resolve ocr.profiles and doc_types.<type>.ocr_profile into the engines to
+    load. Profiles are merged over paddleocr_params; "default" is
+    paddleocr_params unchanged.
+
+    Returns:
+        tuple: ({profile: params} with one entry per distinct set of params in
+        use, {doc_type: profile}); profiles with identical params are served by
+        the first of them.
+
+    Raises:
+        ValueError: If a doc_type names a profile that is not configured.
+    """
+    base = ocr_config["paddleocr_params"]
+    named = {"default": base}
+    for name, overrides in (ocr_config.get("profiles") or {}).items():
+        named[name] = {**base, **(overrides or {})}
+
+    canonical, first_by_params = {}, {}
+    for name, params in named.items():
+        key = json.dumps(params, sort_keys=True)
+        canonical[name] = first_by_params.setdefault(key, name)
+
+    doc_profiles = {}
+    for doc_type, doc_config in doc_types_config.items():
+        name = doc_config.get("ocr_profile", "default")
+        if name not in canonical:
+            raise ValueError(f"Unknown OCR profile {name} for doc_type {doc_type}")
+        doc_profiles[doc_type] = canonical[name]
+    used = {"default", *doc_profiles.values()}
+    profiles = {name: named[name] for name in named if name in used}
+    return profiles, doc_profiles
 
 
 class OCREngine:
-    def __init__(self, config):
-        # Access parameters through paddleocr_params key
-        self.ocr = PaddleOCR(
+    def __init__(self, config, orientation=None, backend=None):
+        """
+        Args:
+            config (dict): paddleocr_params from the OCR config.
+            orientation (dict, optional): Orientation check settings.
+            backend (dict, optional): Inference backend settings; the same
+                det/rec/cls models run on Paddle, Paddle with MKLDNN, ONNX
+                Runtime or OpenVINO.
+        """
+        self.backend_config = backend_config(backend)
+        name = self.backend_config["name"]
+        try:
+            self.ocr = self._create(config, name)
+        except OCRBackendUnavailable as e:
+            fallback = self.backend_config["fallback"]
+            if not fallback or fallback == name:
+                raise
+            logger.warning(f"OCR backend {name} unavailable ({e}), using {fallback}")
+            name = fallback
+            self.ocr = self._create(config, name)
+        self.backend = name
+        self.orientation = {**ORIENTATION_DEFAULTS, **(orientation or {})}
+        # PaddleOCR predictors are not safe to call from several threads at once
+        self._lock = threading.Lock()
+
+    def _create(self, config, backend):
+        cpu_threads = config.get("cpu_threads", 10)
+        params = dict(
             lang=config.get("lang", "en"),
             use_gpu=config.get("use_gpu", False),
             layout_analysis=config.get("layout_analysis", True),
             enable_mkldnn=config.get("enable_mkldnn", False),
+            cpu_threads=cpu_threads,
+            # Text-line crops per recognition forward pass
+            rec_batch_num=config.get("rec_batch_num", 6),
+            # Loads the line angle classifier, used for ambiguous pages
+            use_angle_cls=config.get("use_angle_cls", True),
+        )
+        params.update(
+            {key: config[key] for key in PROFILE_PARAMS if config.get(key) is not None}
         )
+        # ONNX backends bring their own model files
+        params.update(paddleocr_kwargs(backend, self.backend_config, cpu_threads))
+        ocr = PaddleOCR(**params)
+
+        if backend in ONNX_PROVIDERS:
+            # Older PaddleOCR releases ignore onnx_providers and silently run
+            # on the default provider
+            providers = active_providers(ocr)
+            if ONNX_PROVIDERS[backend][0] not in providers:
+                raise OCRBackendUnavailable(
+                    f"PaddleOCR created {providers or 'no'} ONNX sessions"
+                )
+        logger.info(f"OCR engine loaded on the {backend} backend")
+        return ocr
+
+    def extract_text(self, image, output_dir=None, orientation=None):
+        return self.extract_lines(image, output_dir, orientation)["text"]
+
+    def extract_lines(self, image, output_dir=None, orientation=None):
+        """
+        OCR an image, keeping the line structure alongside the formatted text.
+
+        Args:
+            orientation (str, optional): "page", "line" or "none"; defaults to
+                the engine's configured mode.
 
-    def extract_text(self, image, output_dir=None):
-        result = self.ocr.ocr(np.array(image), cls=True)
+        Returns:
+            dict: "text" as produced by extract_text, "lines", a list of
+            {"text", "confidence", "box"} in reading order (boxes refer to the
+            page after any rotation), and "orientation", the check's outcome.
+        """
+        with self._lock:
+            # Arrays from the preprocessor are already contiguous: no copy
+            img, check = self._orient(np.ascontiguousarray(image), orientation)
+            result = self.ocr.ocr(img, cls=check["cls"])
         text = self._format_output(result)
 
         if output_dir:
             os.makedirs(output_dir, exist_ok=True)
             with open(os.path.join(output_dir, "extracted.txt"), "w") as f:
                 f.write(text)
-        return text
+        return {
+            "text": text,
+            "lines": self._format_lines(result),
+            "orientation": check,
+        }
+
+    def _orient(self, img, mode=None):
+        """
+        Apply the orientation mode to a page.
+
+        Returns:
+            tuple: (page to OCR, {"mode", "angle", "ambiguous", "cls"}) where
+            angle is the clockwise rotation applied and cls whether PaddleOCR
+            should classify the angle of each text line.
+        """
+        mode = mode or self.orientation["mode"]
+        check = {"mode": mode, "angle": 0, "ambiguous": False, "cls": mode == "line"}
+        if mode != "page":
+            return img, check
+
+        rotation, ambiguous = self._page_rotation(img)
+        if rotation is not None:
+            img = cv2.rotate(img, rotation)
+        check.update(
+            angle=ROTATION_DEGREES[rotation], ambiguous=ambiguous, cls=ambiguous
+        )
+        return img, check
+
+    def _page_rotation(self, img):
+        """
+        Find the rotation that makes a page upright from a downscaled copy:
+        text line boxes tell vertical from horizontal pages, and recognising a
+        few of the largest lines as they are and turned 180° tells which way up.
+
+        Returns:
+            tuple: (cv2.rotate code or None, whether the check was ambiguous)
+        """
+        settings = self.orientation
+        scale = min(1.0, settings["check_side"] / max(img.shape[:2]))
+        small = img
+        if scale < 1.0:
+            small = cv2.resize(
+                img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA
+            )
+        if small.ndim == 2:
+            small = cv2.cvtColor(small, cv2.COLOR_GRAY2BGR)
+
+        dt_boxes = self.ocr.ocr(small, rec=False)[0]
+        if not dt_boxes:
+            return None, False
+        boxes = np.array(dt_boxes, dtype=np.float32)
+        widths = np.linalg.norm(boxes[:, 1] - boxes[:, 0], axis=1)
+        heights = np.linalg.norm(boxes[:, 3] - boxes[:, 0], axis=1)
+        vertical = bool(np.mean(heights >= 1.5 * widths) > 0.5)
+
+        largest = np.argsort(-(widths * heights))[: settings["sample_lines"]]
+        crops = [get_rotate_crop_image(small, boxes[i]) for i in largest]
+
+        def mean_confidence(images):
+            results = self.ocr.ocr(images, det=False, cls=False)[0]
+            return float(np.mean([score for _, score in results]))
+
+        upright = mean_confidence(crops)
+        if not vertical and upright >= settings["upright_confidence"]:
+            return None, False
+        flipped = mean_confidence([cv2.rotate(c, cv2.ROTATE_180) for c in crops])
+        ambiguous = abs(upright - flipped) < settings["margin"]
+        return PAGE_ROTATIONS[(vertical, flipped > upright)], ambiguous
+
+    def extract_batch(self, images, orientation=None):
+        """
+        OCR several documents at once, sharing recognition batches between them.
+
+        Text lines are detected per image, then the crops of every image are
+        recognised together so that rec_batch_num-sized batches are filled
+        across documents instead of per page.
+
+        Args:
+            images (list): Document images (PIL images or numpy arrays).
+            orientation (str, optional): Orientation mode, as for extract_lines.
+                Line classification runs for the whole batch if any page needs it.
+
+        Returns:
+            list: One text per image, formatted like extract_text.
+        """
+        crops, owners, boxes = [], [], []
+        pages = [[] for _ in images]
+        cls = False
+        with self._lock:
+            for idx, image in enumerate(images):
+                img, check = self._orient(np.ascontiguousarray(image), orientation)
+                cls = cls or check["cls"]
+                if img.ndim == 2:
+                    img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+                dt_boxes = self.ocr.ocr(img, rec=False)[0]
+                if not dt_boxes:
+                    continue
+                for box in sorted_boxes(np.array(dt_boxes, dtype=np.float32)):
+                    crops.append(get_rotate_crop_image(img, box))
+                    owners.append(idx)
+                    boxes.append(box.tolist())
+
+            if crops:
+                # A list input with det=False goes straight to the recogniser,
+                # which sorts crops by width and batches them rec_batch_num at a time
+                rec_res = self.ocr.ocr(crops, det=False, cls=cls)[0]
+                drop_score = getattr(self.ocr, "drop_score", 0.5)
+                for owner, box, (text, score) in zip(owners, boxes, rec_res):
+                    if score >= drop_score:
+                        pages[owner].append([box, (text, score)])
+
+        return [self._format_output([page]) for page in pages]
+
+    def _format_lines(self, result):
+        return [
+            {
+                "text": text,
+                "confidence": round(float(score), 4),
+                "box": [[round(float(x), 1), round(float(y), 1)] for x, y in box],
+            }
+            for page in result
+            if page
+            for box, (text, score) in page
+        ]
 
     def _format_output(self, result):
+        # PaddleOCR returns None for a page without any detected text
         return "\n".join(
-            [" ".join([word_info[-1][0] for word_info in line]) for line in result]
+            [
+                " ".join([word_info[-1][0] for word_info in line])
+                for line in result
+                if line
+            ]
         )
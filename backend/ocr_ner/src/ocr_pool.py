@@ -0,0 +1,217 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# OCREngines owned by the current worker process, by OCR profile (set by
+# _init_worker)
+_engines = {}
+# Barrier of the pool's warm-up jobs (set by _init_worker)
+_warm_barrier = None
+
+# Environment variables sizing the OpenMP, MKL and BLAS thread pools
+THREAD_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")
+
+
+def available_cores():
+    """CPUs this process may run on, which can be fewer than os.cpu_count()."""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def worker_layout(config):
+    """
+    Resolve the workers config into (processes, threads per process).
+
+    "auto" threads split the available cores evenly between the processes;
+    "auto" processes use 2 threads each (or the configured thread count).
+    """
+    cores = len(available_cores())
+    count = config.get("count", 0)
+    threads = config.get("cpu_threads", 1)
+    if count == "auto":
+        count = max(1, cores // (2 if threads == "auto" else threads))
+    if threads == "auto":
+        threads = max(1, cores // max(count, 1))
+    if count * threads > cores:
+        logger.warning(
+            f"{count} OCR workers x {threads} threads oversubscribe {cores} cores"
+        )
+    return count, threads
+
+
+def _pin_worker(cpu_threads, slots):
+    """Pin this worker to its own block of cpu_threads cores."""
+    if not hasattr(os, "sched_setaffinity"):
+        logger.warning("Core pinning is not supported on this platform")
+        return
+    with slots.get_lock():
+        slot = slots.value
+        slots.value += 1
+    cores = available_cores()
+    blocks = max(1, len(cores) // cpu_threads)
+    # Workers restarted later wrap around onto the same blocks
+    start = (slot % blocks) * cpu_threads
+    os.sched_setaffinity(0, cores[start : start + cpu_threads] or cores)
+
+
+def _init_worker(
+    profiles,
+    cpu_threads,
+    orientation=None,
+    backend=None,
+    slots=None,
+    barrier=None,
+):
+    """Limit the worker's thread pools, then load its OCREngines once."""
+    global _warm_barrier
+    _warm_barrier = barrier
+    if slots is not None:
+        _pin_worker(cpu_threads, slots)
+
+    import cv2
+
+    # OpenMP, MKL and BLAS pools are sized from THREAD_VARS, which the worker
+    # inherits from the pool; OpenCV and paddle take the limit explicitly
+    cv2.setNumThreads(cpu_threads)
+
+    from .ocr_engine import OCREngine
+
+    for profile, params in profiles.items():
+        _engines[profile] = OCREngine(
+            dict(params, cpu_threads=cpu_threads), orientation, backend=backend
+        )
+    backends = sorted({engine.backend for engine in _engines.values()})
+    logger.info(
+        f"OCR worker {os.getpid()} ready with profiles {list(_engines)} on "
+        f"{', '.join(backends)}, {cpu_threads} CPU threads on cores "
+        f"{available_cores()}"
+    )
+
+
+def _warm_up(image, timeout):
+    """
+    OCR a blank page once every worker holds one of these jobs, so each job
+    runs in a different worker; returns this worker's pid.
+    """
+    _warm_barrier.wait(timeout)
+    _run_ocr(image)
+    return os.getpid()
+
+
+def _run_ocr(image, output_dir=None, orientation=None, profile="default"):
+    return _engines[profile].extract_lines(image, output_dir, orientation)
+
+
+def _run_ocr_batch(images, orientation=None, profile="default"):
+    return _engines[profile].extract_batch(images, orientation)
+
+
+class OCRWorkerPool:
+    """
+    Pool of OCR worker processes, each holding a preloaded OCREngine per OCR
+    profile.
+
+    PaddleOCR inference is CPU bound and holds the GIL, so running it in the API
+    process stalls every other request on that uvicorn worker. Images submitted
+    here are OCRed in separate processes and the caller only waits on a future.
+    """
+
+    def __init__(
+        self,
+        ocr_params,
+        workers=2,
+        cpu_threads=1,
+        orientation=None,
+        backend=None,
+        pin_cores=False,
+        profiles=None,
+    ):
+        """
+        Args:
+            ocr_params (dict): paddleocr_params of the "default" profile.
+            profiles (dict, optional): Further {profile: params} to load in
+                every worker.
+        """
+        self.workers = workers
+        self.cpu_threads = cpu_threads
+        # Spawned workers re-import the parent's __main__ (and with it numpy,
+        # often paddle) before their initializer runs, so the thread pool
+        # limits must already be in the environment they inherit. This also
+        # sets them for the parent, which does not OCR when it has a pool.
+        for var in THREAD_VARS:
+            os.environ[var] = str(cpu_threads)
+        # spawn, not fork: paddle and OpenCV thread pools do not survive fork
+        context = multiprocessing.get_context("spawn")
+        # Next core block to hand out, when workers are pinned
+        slots = context.Value("i", 0) if pin_cores else None
+        # Holds warm-up jobs until one is running in every worker
+        barrier = context.Barrier(workers)
+        self.executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(
+                {**(profiles or {}), "default": ocr_params},
+                cpu_threads,
+                orientation,
+                backend,
+                slots,
+                barrier,
+            ),
+        )
+
+    def submit(self, image, output_dir=None, orientation=None, profile="default"):
+        """
+        Queue an image for OCR with a profile's engine and return a
+        concurrent.futures.Future that resolves to the OCREngine.extract_lines
+        result.
+        """
+        return self.executor.submit(
+            _run_ocr, np.asarray(image), output_dir, orientation, profile
+        )
+
+    def extract_text(self, image, output_dir=None, orientation=None, profile="default"):
+        return self.extract_lines(image, output_dir, orientation, profile)["text"]
+
+    def extract_lines(
+        self, image, output_dir=None, orientation=None, profile="default"
+    ):
+        return self.submit(image, output_dir, orientation, profile).result()
+
+    async def extract_lines_async(
+        self, image, output_dir=None, orientation=None, profile="default"
+    ):
+        return await asyncio.wrap_future(
+            self.submit(image, output_dir, orientation, profile)
+        )
+
+    def extract_batch(self, images, orientation=None, profile="default"):
+        """OCR a group of images in one worker with shared recognition batches."""
+        images = [np.asarray(image) for image in images]
+        return self.executor.submit(
+            _run_ocr_batch, images, orientation, profile
+        ).result()
+
+    def warm_up(self, timeout=600):
+        """
+        Start every worker and OCR a blank page in each, so no model load or
+        first inference lands on a real request. Workers load their engines
+        in the initializer; the warm-up jobs wait on a barrier until each
+        worker holds one, since an idle worker could otherwise take several.
+        """
+        blank = np.full((64, 256, 3), 255, dtype=np.uint8)
+        futures = [
+            self.executor.submit(_warm_up, blank, timeout) for _ in range(self.workers)
+        ]
+        pids = {future.result() for future in futures}
+        logger.info(f"Warmed up OCR workers {sorted(pids)}")
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
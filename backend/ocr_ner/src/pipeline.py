@@ -1,39 +1,548 @@
+from . import aadhaar_qr
+from .doc_classifier import DocumentClassifier
+from .document_loader import iter_pdf_pages
+from .image_guard import ImageGuard, MemoryBudget
+from .layout_templates import TemplateMatcher, crop
 from .preprocessor import DocumentPreprocessor
-from .ocr_engine import OCREngine
+from .ocr_engine import OCREngine, resolve_profiles
+from .ocr_pool import OCRWorkerPool, worker_layout
 from .ner_processor import NERProcessor
+from .metrics import metrics
+from . import timing
+from .result_cache import DiskCacheBackend, ExtractionCache
+from collections import deque
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import numpy as np
 import yaml
 import os
 
+logger = logging.getLogger(__name__)
+
+# Bump whenever a change alters extracted entities, so cached results are dropped
+PIPELINE_VERSION = 7
+
+
+def load_config(config_path):
+    """Read config.yaml, with prompt paths made absolute based on its directory."""
+    config_dir = os.path.dirname(config_path)
+    with open(config_path) as f:
+        config = yaml.safe_load(f)
+    for doc_config in config["doc_types"].values():
+        doc_config["prompt"] = os.path.join(config_dir, doc_config["prompt"])
+    return config
+
 
 class DocumentProcessingPipeline:
     def __init__(self, config_path):
         # Determine the directory of the config file
         self.config_dir = os.path.dirname(config_path)
+        self.config = load_config(config_path)
 
-        # Load the configuration file
-        with open(config_path) as f:
-            self.config = yaml.safe_load(f)
-
-        # Update prompt paths to be absolute based on config_dir
-        for doc_type in self.config["doc_types"]:
-            prompt_rel_path = self.config["doc_types"][doc_type]["prompt"]
-            self.config["doc_types"][doc_type]["prompt"] = os.path.join(
-                self.config_dir, prompt_rel_path
-            )
+        # Header checks and reduced-scale decoding of uploads, and the bytes of
+        # decoded documents this process may hold at once
+        self.image_guard = ImageGuard(self.config.get("ingestion"))
+        self.memory_budget = MemoryBudget(
+            self.image_guard.config["memory_budget_mb"] * 1024 * 1024
+        )
 
         # Initialize pipeline components
-        self.preprocessor = DocumentPreprocessor()
-        self.ocr = OCREngine(self.config["ocr"]["paddleocr_params"])
+        self.preprocessor = DocumentPreprocessor(
+            config=self.config.get("preprocessing")
+        )
         self.ner = NERProcessor(self.config)
 
+        # OCR runs either in a pool of worker processes or in this process
+        ocr_params = self.config["ocr"]["paddleocr_params"]
+        workers = self.config["ocr"].get("workers", {})
+        self.orientation = self.config["ocr"].get("orientation", {})
+        backend = self.config["ocr"].get("backend")
+        # One engine per distinct OCR profile in use, shared by its doc_types
+        profiles, self.ocr_profiles = resolve_profiles(
+            self.config["ocr"], self.config["doc_types"]
+        )
+        count, cpu_threads = worker_layout(workers)
+        if count > 0:
+            self.ocr = OCRWorkerPool(
+                ocr_params,
+                workers=count,
+                cpu_threads=cpu_threads,
+                orientation=self.orientation,
+                backend=backend,
+                pin_cores=workers.get("pin_cores", False),
+                profiles=profiles,
+            )
+        else:
+            self.ocr_engines = {
+                profile: OCREngine(
+                    params, orientation=self.orientation, backend=backend
+                )
+                for profile, params in profiles.items()
+            }
+            self.ocr = self.ocr_engines["default"]
+        logger.info(f"OCR profiles by doc_type: {self.ocr_profiles}")
+
+        # Per-board layout templates for field region OCR
+        self.templates = None
+        template_config = self.config.get("layout_templates", {})
+        if template_config.get("enabled"):
+            self.templates = TemplateMatcher(
+                os.path.join(
+                    self.config_dir, template_config.get("directory", "templates")
+                )
+            )
+
+        # Doc_type check on the OCR text before the NER prompt is chosen
+        self.classifier = None
+        classifier_config = self.config.get("classifier", {})
+        if classifier_config.get("enabled"):
+            self.classifier = DocumentClassifier(classifier_config)
+
+        # Extraction result cache; the db backend is attached by the API
+        self.cache = None
+        cache_config = self.config.get("cache", {})
+        if cache_config.get("enabled") and cache_config.get("backend") == "disk":
+            self.cache = ExtractionCache(
+                DiskCacheBackend(
+                    cache_config.get("directory", "data/extraction_cache"),
+                    max_entries=cache_config.get("max_entries", 10000),
+                ),
+                self.config,
+                PIPELINE_VERSION,
+            )
+
+    def configure_cache(self, db_backend=None, cipher=None):
+        """
+        Attach the database cache backend (used when cache.backend is "db")
+        and the cipher used to encrypt cached entities.
+        """
+        cache_config = self.config.get("cache", {})
+        if not cache_config.get("enabled"):
+            return
+        if cache_config.get("backend") == "db" and db_backend is not None:
+            self.cache = ExtractionCache(db_backend, self.config, PIPELINE_VERSION)
+        if self.cache is not None:
+            self.cache.cipher = cipher
+
     def process_document(self, document, output_dir=None):
-        # Preprocess image
-        processed_img = self.preprocessor.process(document["image"])
+        """Synchronous wrapper around aprocess_document for threads and scripts."""
+        return asyncio.run(self.aprocess_document(document, output_dir))
+
+    async def aprocess_document(self, document, output_dir=None):
+        """
+        Preprocess, OCR and run NER on a document without blocking the event loop.
+
+        CPU-bound steps run in threads or in the OCR worker pool; the LLM call
+        goes through the async NER client so calls for many documents overlap.
+        """
+        if "pdf" in document:
+            return await self.aprocess_pdf(document, output_dir)
+        doc_type = document["doc_type"]
 
-        # OCR Processing with optional output_dir
-        text = self.ocr.extract_text(processed_img, output_dir)
+        # Aadhaar QR codes carry the fields directly; OCR and NER are the fallback
+        qr = None
+        if self._qr_enabled(doc_type):
+            with timing.span("qr_decode"):
+                qr = await self._aread_aadhaar_qr(document["image"])
+            if qr is not None and qr["entities"]["aadhaarno"]:
+                self._record_qr("qr")
+                return {
+                    "text": aadhaar_qr.render_text(qr["entities"]),
+                    "lines": [],
+                    "entities": qr["entities"],
+                    "metadata": dict(
+                        document,
+                        source="aadhaar_qr",
+                        classification=self._confirmed(doc_type, "aadhaar_qr"),
+                    ),
+                }
+
+        # Preprocess image with the doc_type's profile
+        with timing.span("preprocess"):
+            processed_img, preprocessing = await asyncio.to_thread(
+                self.preprocessor.process_with_report,
+                document["image"],
+                doc_type,
+            )
+        logger.info(
+            f"Preprocessed {doc_type} via {preprocessing['path']} "
+            f"(noise={preprocessing['noise_sigma']}, steps={preprocessing['steps_ms']})"
+        )
+
+        # Known board layouts: OCR only the field regions, else the full page
+        with timing.span("ocr"):
+            ocr = await self._aextract_template_fields(processed_img, doc_type)
+            if ocr is None:
+                # OCR Processing with optional output_dir
+                ocr = await self._aextract_lines(
+                    processed_img,
+                    output_dir,
+                    self._orientation_mode(doc_type),
+                    self._ocr_profile(doc_type),
+                )
+        text = ocr["text"]
+        metadata = dict(
+            document,
+            preprocessing=preprocessing,
+            ocr_profile=self._ocr_profile(doc_type),
+        )
+        if ocr.get("template"):
+            metadata["layout_template"] = ocr["template"]
+            # A matched layout or a decoded QR code already confirms the doc_type
+            classification = self._confirmed(doc_type, "layout_template")
+        elif qr is not None:
+            classification = self._confirmed(doc_type, "aadhaar_qr")
+        else:
+            classification = self._classify(text, doc_type)
+        if classification is not None:
+            metadata["classification"] = classification
+            doc_type = classification["doc_type"]
+
+        if qr is not None:
+            # Secure QR codes only hold the last 4 digits of the Aadhaar number
+            number = aadhaar_qr.find_number(text, qr["last_four"])
+            if number:
+                self._record_qr("qr_with_ocr")
+                return {
+                    "text": text,
+                    "lines": ocr["lines"],
+                    "entities": dict(qr["entities"], aadhaarno=number),
+                    "metadata": dict(metadata, source="aadhaar_qr"),
+                }
+            self._record_qr("fallback", reason="number_not_found")
 
         # Entity Extraction
-        entities = self.ner.extract_entities(text, document["doc_type"])
+        entities = await self.ner.aextract_entities(text, doc_type, ocr["lines"])
+        if qr is not None and isinstance(entities, dict) and "error" not in entities:
+            # Decoded QR values are exact; the LLM only fills what the QR lacks
+            entities.update({k: v for k, v in qr["entities"].items() if v})
+
+        return {
+            "text": text,
+            "lines": ocr["lines"],
+            "entities": entities,
+            "metadata": metadata,
+        }
+
+    async def _aextract_template_fields(self, image, doc_type):
+        """
+        Match the page against the doc_type's layout templates and OCR each
+        field region of the first match.
+
+        Returns:
+            dict or None: {"text", "lines", "template"} where the text has one
+            "field: value" line per region, or None when no template matches.
+        """
+        if self.templates is None:
+            return None
+        candidates = self.templates.candidates(doc_type)
+        if not candidates:
+            return None
+
+        page = np.asarray(image)
+        header_texts = {}
+        for template in candidates:
+            if template.reference_size:
+                aligned = await asyncio.to_thread(template.align, page)
+            else:
+                # Header OCR is shared by templates checking the same region
+                region = tuple(template.match_region)
+                if region not in header_texts:
+                    header = await self._aextract_lines(
+                        crop(page, region),
+                        orientation="none",
+                        profile=self._ocr_profile(doc_type),
+                    )
+                    header_texts[region] = header["text"]
+                matched = template.matches_text(header_texts[region])
+                aligned = page if matched else None
+            if aligned is not None:
+                break
+        else:
+            metrics.incr(
+                "layout_template_documents_total", doc_type=doc_type, outcome="miss"
+            )
+            return None
+
+        fields = list(template.fields)
+        results = await asyncio.gather(
+            *(
+                self._aextract_lines(
+                    np.ascontiguousarray(crop(aligned, template.fields[field])),
+                    orientation="none",
+                    profile=self._ocr_profile(doc_type),
+                )
+                for field in fields
+            )
+        )
+        text_lines, lines = [], []
+        for field, result in zip(fields, results):
+            text_lines.append(f"{field}: {' '.join(result['text'].split())}")
+            lines.extend(dict(line, field=field) for line in result["lines"])
+
+        metrics.incr(
+            "layout_template_documents_total",
+            doc_type=doc_type,
+            outcome="hit",
+            template=template.name,
+        )
+        return {
+            "text": "\n".join(text_lines),
+            "lines": lines,
+            "template": template.name,
+        }
+
+    def _classify(self, text, declared):
+        """
+        Confirm or correct the declared doc_type from OCR text.
+
+        Returns:
+            dict or None: The classifier's decision with "method", or None
+            when the classifier is disabled.
+        """
+        if self.classifier is None:
+            return None
+        with timing.span("classify"):
+            classification = self.classifier.classify(text, declared)
+        classification["method"] = "keywords"
+        outcome = "corrected" if classification["corrected"] else "confirmed"
+        metrics.incr(
+            "doc_classifier_documents_total",
+            declared=declared,
+            doc_type=classification["doc_type"],
+            outcome=outcome,
+        )
+        if classification["corrected"]:
+            logger.warning(
+                f"Document declared as {declared} classified as "
+                f"{classification['doc_type']} "
+                f"(confidence {classification['confidence']:.2f})"
+            )
+        return classification
+
+    def _confirmed(self, doc_type, method):
+        if self.classifier is None:
+            return None
+        return {
+            "declared": doc_type,
+            "doc_type": doc_type,
+            "corrected": False,
+            "confidence": 1.0,
+            "method": method,
+        }
+
+    def _qr_enabled(self, doc_type):
+        if doc_type != "aadhaar":
+            return False
+        qr_config = self.config["doc_types"][doc_type].get("qr", {})
+        return qr_config.get("enabled", False)
+
+    async def _aread_aadhaar_qr(self, image):
+        """
+        Decode the Aadhaar QR code of an image into entities.
+
+        Returns:
+            dict or None: {"entities", "last_four"}, or None (recorded as a
+            fallback) when no QR code is found or it does not decode.
+        """
+        try:
+            payload = await asyncio.to_thread(aadhaar_qr.detect_and_decode, image)
+            if payload is None:
+                self._record_qr("fallback", reason="no_qr")
+                return None
+            fields = aadhaar_qr.parse_payload(payload)
+        except Exception as e:
+            logger.warning(f"Aadhaar QR decoding failed: {str(e)}")
+            self._record_qr("fallback", reason="decode_failed")
+            return None
+        return {
+            "entities": aadhaar_qr.to_entities(fields),
+            "last_four": fields.get("reference_id", "")[:4],
+        }
+
+    def _record_qr(self, outcome, reason=None):
+        labels = {"outcome": outcome}
+        if reason:
+            labels["reason"] = reason
+        metrics.incr("aadhaar_qr_documents_total", **labels)
+        if outcome != "fallback":
+            return
+        fallback_rate = aadhaar_qr_fallback_rate()
+        logger.info(
+            f"Aadhaar QR fallback to OCR+NER ({reason}); "
+            f"fallback rate {fallback_rate:.1%}"
+        )
+
+    def process_pdf(self, document, output_dir=None):
+        return asyncio.run(self.aprocess_pdf(document, output_dir))
+
+    async def aprocess_pdf(self, document, output_dir=None):
+        """
+        Process a (possibly multi-page) PDF page by page.
+
+        Pages are rasterized lazily and preprocessed/OCRed in parallel, at most
+        pdf.pages_in_flight at a time. NER runs on each page in order and the
+        remaining pages are skipped once every configured field has a value.
+        """
+        doc_type = document["doc_type"]
+        pdf_config = self.config.get("pdf", {})
+        in_flight = max(1, pdf_config.get("pages_in_flight", 2))
+        fields = self.config["doc_types"].get(doc_type, {}).get("fields", [])
+
+        pages = iter_pdf_pages(
+            document["pdf"],
+            dpi=pdf_config.get("dpi", 200),
+            max_pages=pdf_config.get("max_pages"),
+            max_pixels=self.image_guard.pixel_budget,
+        )
+        loop = asyncio.get_running_loop()
+        # PyMuPDF documents must stay on one thread
+        rasterizer = ThreadPoolExecutor(max_workers=1)
+
+        async def next_page():
+            # Rasterizing a page is the PDF counterpart of decoding an image
+            with timing.span("decode"):
+                return await loop.run_in_executor(rasterizer, next, pages, None)
+
+        texts, lines, entities, error = [], [], {}, None
+        classification = None
+        pending = deque()
+        try:
+            for _ in range(in_flight):
+                page = await next_page()
+                if page is None:
+                    break
+                pending.append(asyncio.ensure_future(self._aocr_page(page, doc_type)))
+
+            while pending:
+                ocr = await pending.popleft()
+                page = await next_page()
+                if page is not None:
+                    pending.append(
+                        asyncio.ensure_future(self._aocr_page(page, doc_type))
+                    )
+
+                text = ocr["text"]
+                lines.extend(dict(line, page=len(texts)) for line in ocr["lines"])
+                texts.append(text)
+                if len(texts) == 1:
+                    # The first page decides the doc_type of the whole PDF
+                    classification = self._classify(text, doc_type)
+                    if classification is not None:
+                        doc_type = classification["doc_type"]
+                        fields = self.config["doc_types"][doc_type]["fields"]
+                # Fields a later page may supply are followed up once, below
+                page_entities = await self.ner.aextract_entities(
+                    text, doc_type, ocr["lines"], followup=False
+                )
+                if "error" in page_entities:
+                    error = page_entities
+                    continue
+                # Earlier pages win; later pages only fill fields still empty
+                for key, value in page_entities.items():
+                    if value and not entities.get(key):
+                        entities[key] = value
+                    entities.setdefault(key, value)
+
+                if fields and all(entities.get(field) for field in fields):
+                    break
+        finally:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            await loop.run_in_executor(rasterizer, pages.close)
+            rasterizer.shutdown(wait=False)
+
+        text = "\n".join(texts)
+        # One follow-up for what no page supplied, over all pages read; like
+        # single images, not after a failed LLM call, only an unreadable answer
+        if entities or (error and "raw_output" in error):
+            entities = await self.ner.afollow_up(
+                text, doc_type, entities or error, lines
+            )
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+            with open(os.path.join(output_dir, "extracted.txt"), "w") as f:
+                f.write(text)
+
+        metadata = dict(document, pages_processed=len(texts))
+        metadata.pop("pdf")
+        if classification is not None:
+            metadata["classification"] = classification
+        return {
+            "text": text,
+            "lines": lines,
+            "entities": entities or error or {},
+            "metadata": metadata,
+        }
+
+    async def _aocr_page(self, page, doc_type):
+        # Pages overlap, so PDF spans add up to more than the wall-clock time
+        with timing.span("preprocess"):
+            processed = await asyncio.to_thread(
+                self.preprocessor.process, page, doc_type
+            )
+        with timing.span("ocr"):
+            return await self._aextract_lines(
+                processed,
+                orientation=self._orientation_mode(doc_type),
+                profile=self._ocr_profile(doc_type),
+            )
+
+    async def _aextract_lines(
+        self, image, output_dir=None, orientation=None, profile="default"
+    ):
+        if isinstance(self.ocr, OCRWorkerPool):
+            ocr = await self.ocr.extract_lines_async(
+                image, output_dir, orientation, profile
+            )
+        else:
+            ocr = await asyncio.to_thread(
+                self.ocr_engines[profile].extract_lines, image, output_dir, orientation
+            )
+        # Counted here: OCR workers keep their own, unreported, metrics
+        check = ocr.get("orientation")
+        if check and check["mode"] == "page":
+            metrics.incr(
+                "ocr_orientation_pages_total",
+                angle=check["angle"],
+                ambiguous=str(check["ambiguous"]).lower(),
+            )
+        return ocr
+
+    def _ocr_profile(self, doc_type):
+        """OCR profile for a doc_type: doc_types.<type>.ocr_profile, else default."""
+        return self.ocr_profiles.get(doc_type, "default")
+
+    def _orientation_mode(self, doc_type):
+        """Orientation mode for a doc_type: ocr.orientation.doc_types, else mode."""
+        return self.orientation.get("doc_types", {}).get(
+            doc_type, self.orientation.get("mode", "page")
+        )
+
+    def warm_up(self):
+        # Dummy inference on a blank page so PaddleOCR allocates its predictors
+        # before the first real document arrives. The LLM is not called.
+        if isinstance(self.ocr, OCRWorkerPool):
+            self.ocr.warm_up()
+        else:
+            blank = self.preprocessor.process(
+                np.full((64, 256, 3), 255, dtype=np.uint8)
+            )
+            for engine in self.ocr_engines.values():
+                engine.extract_text(blank)
+
+    def close(self):
+        if isinstance(self.ocr, OCRWorkerPool):
+            self.ocr.shutdown()
+
+
+def aadhaar_qr_fallback_rate():
+    """Share of Aadhaar images that needed the LLM because the QR path failed."""
+    return metrics.share("aadhaar_qr_documents_total", outcome="fallback")
+
 
-        return {"text": text, "entities": entities, "metadata": document}
+def layout_template_hit_rate():
+    """Share of documents with layout templates whose page matched one of them."""
+    return metrics.share("layout_template_documents_total", outcome="hit")
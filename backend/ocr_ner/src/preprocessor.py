@@ -1,17 +1,121 @@
+import time
+
 import cv2
 import numpy as np
-from PIL import Image
+
+# Kernel of Immerkær's fast noise variance estimator
+NOISE_KERNEL = np.array([[1, -2, 1], [-2, 4, -2], [1, -2, 1]], dtype=np.float32)
+
+DEFAULT_PROFILE = {
+    "operations": ["resize", "denoise", "threshold"],
+    # Images are downscaled so their long side is at most this many pixels
+    "max_long_side": 2000,
+    # Estimated noise sigma below "skip" is left alone, below "nlmeans" gets a
+    # median blur, anything noisier gets non-local means denoising
+    "noise_thresholds": {"skip": 2.0, "nlmeans": 8.0},
+}
+
+
+def estimate_noise(gray):
+    """Estimate the Gaussian noise sigma of a grayscale image (Immerkær, 1996)."""
+    height, width = gray.shape
+    if height < 3 or width < 3:
+        return 0.0
+    response = cv2.filter2D(gray.astype(np.float32), -1, NOISE_KERNEL)
+    sigma = np.abs(response[1:-1, 1:-1]).sum()
+    return float(sigma * np.sqrt(0.5 * np.pi) / (6 * (width - 2) * (height - 2)))
 
 
 class DocumentPreprocessor:
-    def __init__(self, operations=None):
-        self.operations = operations or ["denoise", "threshold"]
-
-    def process(self, image):
-        img = np.array(image)
-        if "denoise" in self.operations:
-            img = cv2.fastNlMeansDenoisingColored(img, None, 10, 10, 7, 21)
-        if "threshold" in self.operations:
-            img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-            img = cv2.threshold(img, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
-        return Image.fromarray(img)
+    def __init__(self, operations=None, config=None):
+        """
+        Args:
+            operations (list, optional): Operations for the default profile.
+            config (dict, optional): The `preprocessing` section of config.yaml,
+                with an optional `doc_types` mapping of per-doc_type overrides.
+        """
+        config = config or {}
+        self.profile = {**DEFAULT_PROFILE, **config.get("default", {})}
+        if operations:
+            self.profile["operations"] = operations
+        self.doc_type_profiles = config.get("doc_types", {})
+        self.operations = self.profile["operations"]
+
+    def profile_for(self, doc_type=None):
+        return {**self.profile, **self.doc_type_profiles.get(doc_type, {})}
+
+    def process(self, image, doc_type=None):
+        return self.process_with_report(image, doc_type)[0]
+
+    def process_with_report(self, image, doc_type=None):
+        """
+        Preprocess an image with the profile configured for its doc_type.
+
+        Numpy arrays are used as they are; a step only allocates a new image
+        when it changes its size or channels or cannot work in place, and the
+        caller's array is never modified.
+
+        Returns:
+            tuple: (processed contiguous numpy array, report) where report
+            records the denoise path taken, the noise estimate, each step's
+            time in ms and the number of image copies made.
+        """
+        profile = self.profile_for(doc_type)
+        operations = profile["operations"]
+        report = {"path": "none", "noise_sigma": None, "steps_ms": {}, "copies": 0}
+
+        def timed(step, func, img, *args):
+            start = time.perf_counter()
+            result = func(img, *args)
+            report["steps_ms"][step] = round((time.perf_counter() - start) * 1000, 2)
+            if result is not img:
+                report["copies"] += 1
+            return result
+
+        img = np.asarray(image)
+        if img is not image:
+            report["copies"] += 1
+        if img.ndim == 3 and img.shape[2] == 4:
+            img = cv2.cvtColor(img, cv2.COLOR_RGBA2RGB)
+            report["copies"] += 1
+        if "resize" in operations:
+            img = timed("resize", self._resize, img, profile["max_long_side"])
+        if "denoise" in operations:
+            img = timed("denoise", self._denoise, img, profile, report)
+        if "threshold" in operations:
+            # Once any step has copied, the buffer is ours to overwrite
+            owned = report["copies"] > 0 and img.flags.writeable
+            img = timed("threshold", self._threshold, img, owned)
+        if not img.flags.c_contiguous:
+            img = np.ascontiguousarray(img)
+            report["copies"] += 1
+        return img, report
+
+    def _resize(self, img, max_long_side):
+        long_side = max(img.shape[:2])
+        if not max_long_side or long_side <= max_long_side:
+            return img
+        scale = max_long_side / long_side
+        return cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+    def _denoise(self, img, profile, report):
+        gray = img if img.ndim == 2 else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        sigma = estimate_noise(gray)
+        report["noise_sigma"] = round(sigma, 2)
+
+        thresholds = profile["noise_thresholds"]
+        if sigma < thresholds["skip"]:
+            return img
+        if sigma < thresholds["nlmeans"]:
+            report["path"] = "median"
+            return cv2.medianBlur(img, 3)
+        report["path"] = "nlmeans"
+        if img.ndim == 2:
+            return cv2.fastNlMeansDenoising(img, None, 10, 7, 21)
+        return cv2.fastNlMeansDenoisingColored(img, None, 10, 10, 7, 21)
+
+    def _threshold(self, img, owned=False):
+        if img.ndim == 3:
+            img, owned = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY), True
+        flags = cv2.THRESH_BINARY + cv2.THRESH_OTSU
+        return cv2.threshold(img, 0, 255, flags, dst=img if owned else None)[1]
@@ -0,0 +1,98 @@
+import logging
+import threading
+import time
+
+from .pipeline import DocumentProcessingPipeline
+
+
+logger = logging.getLogger(__name__)
+
+
+class PipelineRegistry:
+    """
+    Process-wide store of loaded DocumentProcessingPipeline instances.
+
+    Each config path is loaded at most once per process; concurrent callers
+    asking for the same pipeline wait on a per-path lock instead of loading
+    PaddleOCR a second time.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._path_locks = {}
+        self._pipelines = {}
+        self._status = {}
+
+    def _path_lock(self, config_path):
+        with self._lock:
+            return self._path_locks.setdefault(config_path, threading.Lock())
+
+    def get(self, config_path, warm=False):
+        """
+        Return the pipeline for config_path, loading it on first use.
+
+        Args:
+            config_path (str): Path to the pipeline config.yaml.
+            warm (bool): Also run a dummy inference if the pipeline is still cold.
+
+        Returns:
+            DocumentProcessingPipeline: The shared pipeline instance.
+        """
+        pipeline = self._pipelines.get(config_path)
+        if pipeline is None:
+            with self._path_lock(config_path):
+                pipeline = self._pipelines.get(config_path)
+                if pipeline is None:
+                    pipeline = self._load(config_path)
+        if warm and not self._status[config_path]["warm"]:
+            self.warm_up(config_path)
+        return pipeline
+
+    def _load(self, config_path):
+        start = time.perf_counter()
+        pipeline = DocumentProcessingPipeline(config_path)
+        load_time = time.perf_counter() - start
+        self._status[config_path] = {
+            "load_time_s": round(load_time, 3),
+            "warm": False,
+            "warmup_time_s": None,
+            "loaded_at": time.time(),
+        }
+        self._pipelines[config_path] = pipeline
+        logger.info(f"Loaded pipeline from {config_path} in {load_time:.2f}s")
+        return pipeline
+
+    def warm_up(self, config_path):
+        """Run a dummy OCR inference so the first real document is not cold."""
+        pipeline = self.get(config_path)
+        with self._path_lock(config_path):
+            status = self._status[config_path]
+            if status["warm"]:
+                return
+            start = time.perf_counter()
+            try:
+                pipeline.warm_up()
+            except Exception as e:
+                logger.error(f"Warm-up failed for {config_path}: {str(e)}")
+                return
+            status["warmup_time_s"] = round(time.perf_counter() - start, 3)
+            status["warm"] = True
+            logger.info(
+                f"Pipeline {config_path} warmed up in {status['warmup_time_s']}s"
+            )
+
+    def close(self):
+        """Release every loaded pipeline (OCR worker processes included)."""
+        with self._lock:
+            pipelines = list(self._pipelines.values())
+            self._pipelines.clear()
+            self._status.clear()
+        for pipeline in pipelines:
+            pipeline.close()
+
+    def status(self):
+        """Return load time and warm/cold status for every loaded pipeline."""
+        return {path: dict(status) for path, status in self._status.items()}
+
+
+registry = PipelineRegistry()
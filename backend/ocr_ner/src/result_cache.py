@@ -0,0 +1,207 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from datetime import datetime, timezone
+
+from .metrics import metrics
+
+
+logger = logging.getLogger(__name__)
+
+
+def sha256_hex(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class DiskCacheBackend:
+    """
+    JSON files under `directory`, evicted least-recently-used once more than
+    `max_entries` are stored. A hit touches the file's mtime, so mtime order
+    is recency order.
+    """
+
+    def __init__(self, directory, max_entries=10000):
+        self.directory = directory
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._count = sum(1 for _ in self._entries())
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _entries(self):
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".json"):
+                    yield os.path.join(root, name)
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                value = json.load(f)
+            os.utime(path)
+            return value
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def set(self, key, value):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(value, f, ensure_ascii=False)
+        with self._lock:
+            is_new = not os.path.exists(path)
+            os.replace(tmp_path, path)
+            if is_new:
+                self._count += 1
+            if self._count > self.max_entries:
+                self._evict()
+
+    def _evict(self):
+        # Drop the oldest 10% in one pass rather than scanning on every insert
+        entries = sorted(self._entries(), key=os.path.getmtime)
+        excess = self._count - self.max_entries + max(1, self.max_entries // 10)
+        for path in entries[:excess]:
+            try:
+                os.remove(path)
+                self._count -= 1
+            except FileNotFoundError:
+                pass
+
+
+class DatabaseCacheBackend:
+    """
+    Cache entries stored as rows of a SQLAlchemy model with `key`, `doc_type`,
+    `entities`, `created_at` and `last_used_at` columns.
+    """
+
+    def __init__(self, session_factory, model):
+        self.session_factory = session_factory
+        self.model = model
+
+    def get(self, key):
+        db = self.session_factory()
+        try:
+            entry = db.get(self.model, key)
+            if entry is None:
+                return None
+            entry.last_used_at = datetime.now(timezone.utc)
+            db.commit()
+            return entry.entities
+        finally:
+            db.close()
+
+    def set(self, key, value):
+        db = self.session_factory()
+        try:
+            now = datetime.now(timezone.utc)
+            db.merge(
+                self.model(
+                    key=key,
+                    doc_type=value["doc_type"],
+                    entities=value,
+                    created_at=now,
+                    last_used_at=now,
+                )
+            )
+            db.commit()
+        finally:
+            db.close()
+
+
+class ExtractionCache:
+    """
+    Content-addressed store of extraction results (entities and OCR lines).
+
+    The key covers the file bytes, the doc_type, the prompt file contents, the
+    LLM model and the pipeline version, so editing a prompt or switching models
+    produces new keys and stale entries simply age out of the backend. Entries
+    also record the doc_type the classifier had them extracted as and that
+    prompt's hash; one whose prompt has changed since is a miss.
+    """
+
+    def __init__(self, backend, config, pipeline_version, cipher=None):
+        self.backend = backend
+        # Results hold personal data; with a cipher (e.g. Fernet) they are
+        # stored encrypted
+        self.cipher = cipher
+        self.llm_model = config["ner"]["llm_model"]
+        self.pipeline_version = pipeline_version
+        self.prompt_hashes = {}
+        for doc_type, doc_config in config["doc_types"].items():
+            with open(doc_config["prompt"], "rb") as f:
+                self.prompt_hashes[doc_type] = sha256_hex(f.read())
+
+    def key(self, file_bytes, doc_type):
+        parts = [
+            sha256_hex(file_bytes),
+            doc_type,
+            self.prompt_hashes.get(doc_type, ""),
+            self.llm_model,
+            str(self.pipeline_version),
+        ]
+        return sha256_hex("|".join(parts).encode())
+
+    def get(self, file_bytes, doc_type):
+        try:
+            entry = self.backend.get(self.key(file_bytes, doc_type))
+        except Exception as e:
+            logger.error(f"Extraction cache lookup failed: {str(e)}")
+            entry = None
+        result = None
+        if entry is not None and self._current(entry):
+            result = self._unpack(entry)
+        if result is None:
+            metrics.incr("extraction_cache_misses_total", doc_type=doc_type)
+            return None
+        metrics.incr("extraction_cache_hits_total", doc_type=doc_type)
+        return result
+
+    def set(self, file_bytes, doc_type, result, extracted_as=None):
+        """
+        Store a result under the doc_type it was requested as; extracted_as is
+        the doc_type whose prompt produced it, when the classifier changed it.
+        """
+        try:
+            self.backend.set(
+                self.key(file_bytes, doc_type),
+                self._pack(doc_type, extracted_as or doc_type, result),
+            )
+        except Exception as e:
+            logger.error(f"Extraction cache store failed: {str(e)}")
+
+    def _current(self, entry):
+        """Whether the prompt the entry was extracted with is unchanged."""
+        extracted_as = entry.get("extracted_as")
+        return (
+            extracted_as in self.prompt_hashes
+            and entry.get("prompt_hash") == self.prompt_hashes[extracted_as]
+        )
+
+    def _pack(self, doc_type, extracted_as, result):
+        entry = {
+            "doc_type": doc_type,
+            "extracted_as": extracted_as,
+            "prompt_hash": self.prompt_hashes.get(extracted_as, ""),
+        }
+        if self.cipher is None:
+            return {**entry, "result": result}
+        token = self.cipher.encrypt(json.dumps(result).encode()).decode()
+        return {**entry, "encrypted_result": token}
+
+    def _unpack(self, entry):
+        if "encrypted_result" not in entry:
+            return entry.get("result")
+        if self.cipher is None:
+            return None
+        try:
+            token = entry["encrypted_result"].encode()
+            return json.loads(self.cipher.decrypt(token))
+        except Exception:
+            # Written under a different key; treat as a miss
+            return None
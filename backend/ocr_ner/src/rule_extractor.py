@@ -0,0 +1,193 @@
+import re
+from datetime import datetime
+
+from post_processing.tasks.handle_dob import parse_date
+from post_processing.tasks.normalize_passout import normalize_year
+
+# Verhoeff checksum tables; the last digit of an Aadhaar number is its check digit
+VERHOEFF_D = [
+    [0, 1, 2, 3, 4, 5, 6, 7, 8, 9],
+    [1, 2, 3, 4, 0, 6, 7, 8, 9, 5],
+    [2, 3, 4, 0, 1, 7, 8, 9, 5, 6],
+    [3, 4, 0, 1, 2, 8, 9, 5, 6, 7],
+    [4, 0, 1, 2, 3, 9, 5, 6, 7, 8],
+    [5, 9, 8, 7, 6, 0, 4, 3, 2, 1],
+    [6, 5, 9, 8, 7, 1, 0, 4, 3, 2],
+    [7, 6, 5, 9, 8, 2, 1, 0, 4, 3],
+    [8, 7, 6, 5, 9, 3, 2, 1, 0, 4],
+    [9, 8, 7, 6, 5, 4, 3, 2, 1, 0],
+]
+VERHOEFF_P = [
+    [0, 1, 2, 3, 4, 5, 6, 7, 8, 9],
+    [1, 5, 7, 6, 2, 8, 3, 0, 9, 4],
+    [5, 8, 0, 3, 7, 9, 6, 1, 4, 2],
+    [8, 9, 1, 6, 0, 4, 3, 5, 2, 7],
+    [9, 4, 5, 3, 1, 2, 6, 8, 7, 0],
+    [4, 2, 8, 6, 5, 7, 3, 9, 0, 1],
+    [2, 7, 9, 3, 8, 0, 6, 4, 1, 5],
+    [7, 0, 4, 6, 9, 1, 3, 2, 5, 8],
+]
+
+# 12 digits, optionally in groups of 4, not part of a longer run such as a VID
+AADHAAR_NUMBER = re.compile(
+    r"(?<!\d)(?<!\d )([2-9]\d{3}) ?(\d{4}) ?(\d{4})(?! ?\d)"
+)
+DOB = re.compile(
+    r"(?:DOB|D\.O\.B\.?|Date of Birth)\s*[:\-]?\s*(\d{2}[/\-]\d{2}[/\-]\d{4})",
+    re.IGNORECASE,
+)
+GENDER = re.compile(r"\b(male|female|transgender)\b", re.IGNORECASE)
+ROLL_NUMBER = re.compile(
+    r"\bRoll\s*(?:No\.?|Number)\s*[:\-.]?\s*([A-Z0-9][A-Z0-9/\-]{3,})\b",
+    re.IGNORECASE,
+)
+PASSOUT = re.compile(
+    r"(?:held in|year of passing|passed in)\s*[:\-]?\s*(?:[A-Za-z]+,?\s*)?"
+    r"((?:19|20)\d{2})\b",
+    re.IGNORECASE,
+)
+DIVISION = re.compile(
+    r"\b(first|second|third|1st|2nd|3rd)\s+division\b"
+    r"|\bdivision\s*[:\-]?\s*(first|second|third|1st|2nd|3rd|III|II|I)\b",
+    re.IGNORECASE,
+)
+
+
+def verhoeff_valid(number):
+    check = 0
+    for i, digit in enumerate(reversed(number)):
+        check = VERHOEFF_D[check][VERHOEFF_P[i % 8][int(digit)]]
+    return check == 0
+
+
+def _single(values):
+    """The value if every match agrees, else None: ambiguity goes to the LLM."""
+    values = {v for v in values if v}
+    return values.pop() if len(values) == 1 else None
+
+
+def extract_aadhaarno(text):
+    numbers = ("".join(match.groups()) for match in AADHAAR_NUMBER.finditer(text))
+    number = _single(n for n in numbers if verhoeff_valid(n))
+    return f"{number[:4]} {number[4:8]} {number[8:]}" if number else None
+
+
+def extract_dob(text):
+    dates = []
+    for match in DOB.finditer(text):
+        value = match.group(1)
+        try:
+            datetime.strptime(value.replace("/", "-"), "%d-%m-%Y")
+        except ValueError:
+            continue
+        dates.append(value)
+    return _single(dates)
+
+
+def extract_gender(text):
+    return _single(match.group(1).capitalize() for match in GENDER.finditer(text))
+
+
+def extract_roll_number(text):
+    return _single(
+        match.group(1)
+        for match in ROLL_NUMBER.finditer(text)
+        if any(char.isdigit() for char in match.group(1))
+    )
+
+
+def extract_passout(text):
+    return _single(match.group(1) for match in PASSOUT.finditer(text))
+
+
+def extract_division(text):
+    return _single(
+        f"{(match.group(1) or match.group(2)).lower()} division"
+        for match in DIVISION.finditer(text)
+    )
+
+
+RULES = {
+    "aadhaarno": extract_aadhaarno,
+    "dob": extract_dob,
+    "gender": extract_gender,
+    "roll_number": extract_roll_number,
+    "passout": extract_passout,
+    "division": extract_division,
+}
+
+
+def valid_aadhaarno(value):
+    digits = re.sub(r"\s", "", value)
+    return len(digits) == 12 and digits.isdigit() and verhoeff_valid(digits)
+
+
+def valid_year(value):
+    return re.fullmatch(r"(?:19|20)\d{2}", value) is not None
+
+
+def valid_dob(value):
+    # Checked as post-processing will store it; the Aadhaar QR may only
+    # carry the year of birth
+    if valid_year(value.strip()):
+        return True
+    try:
+        datetime.strptime(parse_date(value), "%d-%m-%Y")
+    except ValueError:
+        return False
+    return True
+
+
+def valid_gender(value):
+    return value.strip().lower() in ("male", "female", "transgender")
+
+
+def valid_roll_number(value):
+    return any(char.isdigit() for char in value)
+
+
+def valid_passout(value):
+    # "March 2019" is stored as 2019 by post-processing
+    return valid_year(normalize_year(value.strip()))
+
+
+# Format checks of extracted values, for fields whose format is known
+FORMATS = {
+    "aadhaarno": valid_aadhaarno,
+    "dob": valid_dob,
+    "gender": valid_gender,
+    "roll_number": valid_roll_number,
+    "passout": valid_passout,
+}
+
+
+def valid_format(field, value):
+    """Whether a field's value has a possible format; fields without a check pass."""
+    check = FORMATS.get(field)
+    return check is None or check(value)
+
+
+class RuleExtractor:
+    """
+    Deterministic extraction of fields with tight formats from OCR text.
+
+    Each doc_type lists the fields to try under `rules` in config.yaml. A
+    field is only filled when the rule finds exactly one distinct value.
+    """
+
+    def __init__(self, doc_types_config):
+        self.rules = {}
+        for doc_type, config in doc_types_config.items():
+            fields = [f for f in config.get("rules", []) if f in config["fields"]]
+            unknown = set(fields) - set(RULES)
+            if unknown:
+                raise ValueError(f"No extraction rule for {sorted(unknown)}")
+            self.rules[doc_type] = fields
+
+    def extract(self, text, doc_type):
+        entities = {}
+        for field in self.rules.get(doc_type, []):
+            value = RULES[field](text)
+            if value:
+                entities[field] = value
+        return entities
@@ -0,0 +1,151 @@
+import re
+
+from .metrics import metrics
+
+WHITESPACE = re.compile(r"\s+")
+# Runs of one non-alphanumeric glyph, e.g. "-----" or "|||||" from rules and borders
+GLYPH_RUN = re.compile(r"([^\w\s])\1{2,}")
+
+DEFAULTS = {
+    "enabled": True,
+    # OCR lines below this recognition confidence are dropped
+    "min_confidence": 0.6,
+    # Lines shorter than this, or with fewer letters and digits than this ratio,
+    # are noise (stray glyphs, stamps, watermark fragments)
+    "min_chars": 2,
+    "min_alnum_ratio": 0.5,
+    # Regexes of lines to drop, matched case-insensitively
+    "boilerplate": [],
+    # Prompt budget for the OCR text, in estimated tokens
+    "token_budget": 768,
+    # Per-doc_type {token_budget, keywords, boilerplate} overrides
+    "doc_types": {},
+}
+
+
+def estimate_tokens(text):
+    """Rough LLM token count: about 4 characters per token for English text."""
+    return (len(text) + 3) // 4
+
+
+class TextCompactor:
+    """
+    Shrink OCR text before it goes into an NER prompt.
+
+    Low-confidence, noisy, boilerplate and duplicate lines are dropped and
+    whitespace is collapsed. If the text is still over the doc_type's token
+    budget, lines mentioning a field keyword are kept first and the rest in
+    reading order until the budget is spent.
+    """
+
+    def __init__(self, config, doc_types_config):
+        self.config = {**DEFAULTS, **(config or {})}
+        self.enabled = self.config["enabled"]
+        self.profiles = {}
+        for doc_type, doc_config in doc_types_config.items():
+            overrides = self.config["doc_types"].get(doc_type, {})
+            # Field names ("father_name") are keywords, plus any configured ones
+            keywords = {
+                word
+                for field in doc_config.get("fields", [])
+                for word in field.split("_")
+                if len(word) > 2
+            }
+            keywords.update(k.lower() for k in overrides.get("keywords", []))
+            boilerplate = self.config["boilerplate"] + overrides.get("boilerplate", [])
+            self.profiles[doc_type] = {
+                "token_budget": overrides.get(
+                    "token_budget", self.config["token_budget"]
+                ),
+                "keywords": re.compile(
+                    r"\b(?:" + "|".join(map(re.escape, sorted(keywords))) + r")",
+                    re.IGNORECASE,
+                ),
+                "boilerplate": [re.compile(p, re.IGNORECASE) for p in boilerplate],
+            }
+
+    def compact(self, text, doc_type, lines=None):
+        """
+        Args:
+            text (str): OCR text, used when there are no lines.
+            doc_type (str): Selects the token budget, keywords and boilerplate.
+            lines (list, optional): OCR lines ({"text", "confidence"}) in
+                reading order, as returned alongside the text.
+
+        Returns:
+            tuple: (compacted text, report with "tokens_before", "tokens_after"
+            and the number of lines dropped by each step)
+        """
+        profile = self.profiles.get(doc_type)
+        if not self.enabled or profile is None:
+            return text, None
+        if not lines or "field" in lines[0]:
+            # Layout template lines only make sense with the field names the
+            # text puts in front of them
+            lines = [{"text": line} for line in text.splitlines()]
+
+        report = {
+            "tokens_before": estimate_tokens(text),
+            "low_confidence": 0,
+            "noise": 0,
+            "boilerplate": 0,
+            "duplicate": 0,
+            "over_budget": 0,
+        }
+        kept, seen = [], set()
+        for line in lines:
+            if line.get("confidence", 1.0) < self.config["min_confidence"]:
+                report["low_confidence"] += 1
+                continue
+            cleaned = WHITESPACE.sub(" ", GLYPH_RUN.sub(" ", line["text"])).strip()
+            if self._is_noise(cleaned):
+                report["noise"] += 1
+                continue
+            if any(pattern.search(cleaned) for pattern in profile["boilerplate"]):
+                report["boilerplate"] += 1
+                continue
+            key = cleaned.lower()
+            if key in seen:
+                report["duplicate"] += 1
+                continue
+            seen.add(key)
+            kept.append(cleaned)
+
+        kept = self._fit_budget(kept, profile, report)
+        compacted = "\n".join(kept)
+        report["tokens_after"] = estimate_tokens(compacted)
+        metrics.incr(
+            "ner_compaction_tokens_saved_total",
+            report["tokens_before"] - report["tokens_after"],
+            doc_type=doc_type,
+        )
+        return compacted, report
+
+    def _is_noise(self, line):
+        if len(line) < self.config["min_chars"]:
+            return True
+        alnum = sum(char.isalnum() for char in line)
+        return alnum / len(line) < self.config["min_alnum_ratio"]
+
+    def _fit_budget(self, lines, profile, report):
+        budget = profile["token_budget"]
+        costs = [estimate_tokens(line) + 1 for line in lines]  # +1 for the newline
+        if sum(costs) <= budget:
+            return lines
+
+        # Keyword lines first, then the rest, each in reading order
+        order = sorted(
+            range(len(lines)),
+            key=lambda i: (not profile["keywords"].search(lines[i]), i),
+        )
+        selected, spent = set(), 0
+        for i in order:
+            if spent + costs[i] <= budget:
+                selected.add(i)
+                spent += costs[i]
+        if not selected and lines:
+            # A single line over the whole budget is cut rather than dropped
+            report["over_budget"] = len(lines) - 1
+            return [lines[order[0]][: budget * 4]]
+        report["over_budget"] = len(lines) - len(selected)
+        return [line for i, line in enumerate(lines) if i in selected]
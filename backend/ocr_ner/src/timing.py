@@ -0,0 +1,109 @@
+import contextlib
+import contextvars
+import json
+import logging
+import time
+
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Histogram every stage duration is observed into, labeled by stage and doc_type
+STAGE_METRIC = "stage_duration_ms"
+
+_current = contextvars.ContextVar("document_timings", default=None)
+
+
+class DocumentTimings:
+    """
+    Per-document stage spans, in ms.
+
+    Spans are recorded on the timings active in the current context, which
+    asyncio tasks and asyncio.to_thread inherit, so pipeline stages can record
+    themselves without the timings being passed around. Each span is also
+    observed into the stage_duration_ms histogram as it ends.
+    """
+
+    def __init__(self, doc_type, **fields):
+        self.doc_type = doc_type
+        self.fields = fields
+        self.spans = {}
+        self.start = time.perf_counter()
+        self._token = None
+
+    def activate(self):
+        self._token = _current.set(self)
+        return self
+
+    def deactivate(self):
+        if self._token is not None:
+            _current.reset(self._token)
+            self._token = None
+
+    @contextlib.contextmanager
+    def span(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, (time.perf_counter() - start) * 1000)
+
+    def record(self, stage, ms):
+        # Stages that run more than once per document (PDF pages) add up
+        self.spans[stage] = self.spans.get(stage, 0.0) + ms
+        metrics.observe(STAGE_METRIC, ms, stage=stage, doc_type=self.doc_type)
+
+    def finish(self, **fields):
+        """Record the end-to-end time and log the spans as one JSON line."""
+        self.record("total", (time.perf_counter() - self.start) * 1000)
+        record = {
+            "doc_type": self.doc_type,
+            **self.fields,
+            **fields,
+            "spans_ms": {stage: round(ms, 1) for stage, ms in self.spans.items()},
+        }
+        logger.info(f"document timings {json.dumps(record, default=str)}")
+        return record
+
+
+def current():
+    return _current.get()
+
+
+def start_document(doc_type, **fields):
+    """Start and activate timings for a document in the current context."""
+    return DocumentTimings(doc_type, **fields).activate()
+
+
+@contextlib.contextmanager
+def span(stage):
+    """Time a stage of the current document; a no-op outside of one."""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    with timings.span(stage):
+        yield
+
+
+def record(stage, ms):
+    timings = _current.get()
+    if timings is not None:
+        timings.record(stage, ms)
+
+
+def stage_latencies():
+    """p50/p95/count of every stage, by doc_type then stage."""
+    latencies = {}
+    for key, summary in metrics.histograms(STAGE_METRIC).items():
+        labels = dict(
+            part.split("=", 1) for part in key[len(STAGE_METRIC) + 1 : -1].split(",")
+        )
+        doc_type = labels["doc_type"].strip('"')
+        stage = labels["stage"].strip('"')
+        latencies.setdefault(doc_type, {})[stage] = {
+            "count": summary["count"],
+            "p50_ms": summary["p50"],
+            "p95_ms": summary["p95"],
+        }
+    return latencies
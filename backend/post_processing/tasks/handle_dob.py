@@ -29,6 +29,9 @@ def parse_date(date_str: str) -> str:
         "%Y/%m/%d",
         "%m/%d/%Y",
         "%m-%d-%Y",
+        # Dotted dates, whose dots became spaces above
+        "%d %m %Y",
+        "%d %m %y",
     ]
 
     for fmt in date_formats:
@@ -0,0 +1,112 @@
+"""
+Compare peak RSS and image copies per document of the PIL-based image path
+and the numpy path (decode once with cv2.imdecode, preprocess in place).
+
+Each path runs in a fresh process so ru_maxrss is not shared. Run from the
+backend directory:
+    python -m script.benchmark_memory --input-dir data/test --ocr
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+from ocr_ner.data_extractor import CONFIG_PATH
+from ocr_ner.src.document_loader import decode_image
+from ocr_ner.src.preprocessor import DocumentPreprocessor
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def legacy_path(data, preprocessor):
+    """Image.open -> np.array -> preprocess -> Image.fromarray -> np.array."""
+    image = Image.open(BytesIO(data))  # BytesIO over the download
+    image.load()  # decode
+    img, report = preprocessor.process_with_report(np.array(image))  # np.array
+    processed = Image.fromarray(img)  # handed back as a PIL image
+    # decode + np.array + preprocessing + fromarray + np.array in OCREngine
+    return np.array(processed), 4 + report["copies"]
+
+
+def numpy_path(data, preprocessor):
+    img = decode_image(data)
+    processed, report = preprocessor.process_with_report(img)
+    return processed, 1 + report["copies"]
+
+
+def run(mode, paths, with_ocr):
+    import yaml
+
+    with open(CONFIG_PATH) as f:
+        config = yaml.safe_load(f)
+    preprocessor = DocumentPreprocessor(config=config.get("preprocessing"))
+    engine = None
+    if with_ocr:
+        from ocr_ner.src.ocr_engine import OCREngine
+
+        engine = OCREngine(config["ocr"]["paddleocr_params"])
+
+    path_func = legacy_path if mode == "legacy" else numpy_path
+    baseline = peak_rss_mb()
+    copies, start = [], time.perf_counter()
+    for path in paths:
+        with open(path, "rb") as f:
+            data = f.read()
+        img, n_copies = path_func(data, preprocessor)
+        if engine is not None:
+            engine.extract_lines(img)
+        copies.append(n_copies)
+    return {
+        "mode": mode,
+        "documents": len(paths),
+        "copies_per_document": round(sum(copies) / len(copies), 2),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "peak_rss_over_baseline_mb": round(peak_rss_mb() - baseline, 1),
+        "seconds": round(time.perf_counter() - start, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--input-dir", required=True)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--ocr", action="store_true", help="Include OCR in the run")
+    parser.add_argument("--mode", choices=["legacy", "numpy"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    paths = [
+        os.path.join(args.input_dir, name)
+        for name in sorted(os.listdir(args.input_dir))
+        if name.lower().endswith((".png", ".jpg", ".jpeg"))
+    ][: args.limit]
+    if not paths:
+        raise SystemExit(f"No images found in {args.input_dir}")
+
+    if args.mode:
+        # Child process: measure one path and print its report
+        print(json.dumps(run(args.mode, paths, args.ocr)))
+        return
+
+    reports = []
+    for mode in ("legacy", "numpy"):
+        command = [sys.executable, "-m", "script.benchmark_memory", "--mode", mode]
+        command += ["--input-dir", args.input_dir, "--limit", str(args.limit)]
+        if args.ocr:
+            command.append("--ocr")
+        output = subprocess.run(command, capture_output=True, text=True, check=True)
+        reports.append(json.loads(output.stdout.strip().splitlines()[-1]))
+    print(json.dumps(reports, indent=4))
+
+
+if __name__ == "__main__":
+    main()
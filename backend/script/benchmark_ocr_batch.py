@@ -0,0 +1,83 @@
+"""
+Compare per-image OCR cost of OCREngine.extract_text and OCREngine.extract_batch.
+
+Run from the backend directory:
+    python -m script.benchmark_ocr_batch --input-dir data/test --batch-sizes 6 16 32
+"""
+
+import argparse
+import json
+import os
+import time
+
+import cv2
+import yaml
+
+from ocr_ner.data_extractor import CONFIG_PATH
+from ocr_ner.src.ocr_engine import OCREngine
+from ocr_ner.src.preprocessor import DocumentPreprocessor
+
+
+def load_images(input_dir, limit):
+    images = []
+    for filename in sorted(os.listdir(input_dir)):
+        if filename.lower().endswith((".png", ".jpg", ".jpeg")):
+            images.append(cv2.imread(os.path.join(input_dir, filename)))
+        if len(images) == limit:
+            break
+    return images
+
+
+def time_single(engine, images):
+    start = time.perf_counter()
+    for image in images:
+        engine.extract_text(image)
+    return time.perf_counter() - start
+
+
+def time_batch(engine, images, docs_per_call):
+    start = time.perf_counter()
+    for i in range(0, len(images), docs_per_call):
+        engine.extract_batch(images[i : i + docs_per_call])
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--input-dir", required=True)
+    parser.add_argument("--limit", type=int, default=24)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[6, 16, 32])
+    parser.add_argument("--docs-per-call", type=int, default=6)
+    args = parser.parse_args()
+
+    with open(CONFIG_PATH) as f:
+        ocr_params = yaml.safe_load(f)["ocr"]["paddleocr_params"]
+
+    preprocessor = DocumentPreprocessor()
+    images = [
+        preprocessor.process(image) for image in load_images(args.input_dir, args.limit)
+    ]
+    if not images:
+        raise SystemExit(f"No images found in {args.input_dir}")
+
+    report = {"images": len(images), "docs_per_call": args.docs_per_call, "runs": []}
+    for batch_size in args.batch_sizes:
+        engine = OCREngine(dict(ocr_params, rec_batch_num=batch_size))
+        engine.extract_text(images[0])  # warm-up
+
+        single = time_single(engine, images)
+        batch = time_batch(engine, images, args.docs_per_call)
+        report["runs"].append(
+            {
+                "rec_batch_num": batch_size,
+                "single_ms_per_image": round(1000 * single / len(images), 1),
+                "batch_ms_per_image": round(1000 * batch / len(images), 1),
+                "speedup": round(single / batch, 2) if batch else None,
+            }
+        )
+
+    print(json.dumps(report, indent=4))
+
+
+if __name__ == "__main__":
+    main()
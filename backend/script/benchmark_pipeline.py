@@ -0,0 +1,223 @@
+"""
+Benchmark preprocessing, OCR and NER on synthetic documents against the mock LLM.
+
+Reports per-stage p50/p95 latency, documents per second, peak memory and
+field recall as JSON, with the commit, seed and a digest of the pipeline
+config so runs on different commits can be compared. Run from the backend
+directory:
+    python -m script.benchmark_pipeline --count 24 --output bench.json
+"""
+
+import argparse
+import asyncio
+import copy
+import hashlib
+import json
+import os
+import platform
+import re
+import resource
+import socket
+import subprocess
+import time
+
+import numpy as np
+import yaml
+
+from ocr_ner.data_extractor import CONFIG_PATH
+from ocr_ner.src import mock_llm
+from ocr_ner.src.ner_processor import NERProcessor
+from ocr_ner.src.ocr_engine import OCREngine, resolve_profiles
+from ocr_ner.src.preprocessor import DocumentPreprocessor
+from script.synthetic_documents import DOC_TYPES, generate
+
+STAGES = ["preprocess", "ocr", "ner", "total"]
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def normalize(value):
+    return re.sub(r"[^a-z0-9]", "", str(value or "").lower())
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return f"{commit}-dirty" if dirty else commit
+
+
+def config_digest(config):
+    # Sections that change what the pipeline does, not where it writes
+    sections = {k: config.get(k) for k in ("ocr", "preprocessing", "doc_types", "ner")}
+    encoded = json.dumps(sections, sort_keys=True, default=str).encode()
+    return hashlib.sha256(encoded).hexdigest()[:12]
+
+
+def load_config():
+    with open(CONFIG_PATH) as f:
+        return yaml.safe_load(f)
+
+
+def build_stages(config, base_url):
+    config = copy.deepcopy(config)
+    config_dir = os.path.dirname(CONFIG_PATH)
+    for doc_config in config["doc_types"].values():
+        doc_config["prompt"] = os.path.join(config_dir, doc_config["prompt"])
+    config["ner"]["base_url"] = base_url
+    preprocessor = DocumentPreprocessor(config=config.get("preprocessing"))
+    # One engine per OCR profile, as the pipeline loads them
+    profiles, doc_profiles = resolve_profiles(config["ocr"], config["doc_types"])
+    engines = {
+        profile: OCREngine(
+            params,
+            orientation=config["ocr"].get("orientation"),
+            backend=config["ocr"].get("backend"),
+        )
+        for profile, params in profiles.items()
+    }
+    by_doc_type = {
+        doc_type: engines[profile] for doc_type, profile in doc_profiles.items()
+    }
+    return preprocessor, by_doc_type, NERProcessor(config)
+
+
+async def run(documents, preprocessor, engines, ner):
+    timings = {stage: [] for stage in STAGES}
+    recall = {"ocr": [0, 0], "entities": [0, 0]}
+    for document in documents:
+        doc_type = document["doc_type"]
+        start = time.perf_counter()
+        img, _ = preprocessor.process_with_report(document["image"], doc_type)
+        preprocessed = time.perf_counter()
+        ocr = engines[doc_type].extract_lines(img)
+        recognised = time.perf_counter()
+        entities = await ner.aextract_entities(ocr["text"], doc_type, ocr["lines"])
+        end = time.perf_counter()
+
+        for stage, ms in zip(
+            STAGES,
+            (preprocessed - start, recognised - preprocessed, end - recognised),
+        ):
+            timings[stage].append(ms * 1000)
+        timings["total"].append((end - start) * 1000)
+
+        # Ground truth found anywhere in the OCR text, and in the entities
+        text = normalize(ocr["text"])
+        for field, expected in document["fields"].items():
+            if not expected:
+                continue
+            recall["ocr"][1] += 1
+            recall["ocr"][0] += normalize(expected) in text
+            recall["entities"][1] += 1
+            recall["entities"][0] += normalize(entities.get(field)) == normalize(
+                expected
+            )
+    return timings, recall
+
+
+def summarize(values):
+    return {
+        "p50_ms": round(float(np.percentile(values, 50)), 1),
+        "p95_ms": round(float(np.percentile(values, 95)), 1),
+        "mean_ms": round(float(np.mean(values)), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--count", type=int, default=24)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--doc-types", nargs="+", default=DOC_TYPES)
+    parser.add_argument(
+        "--base-url", help="LLM endpoint to use instead of an in-process mock LLM"
+    )
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    args = parser.parse_args()
+
+    config = load_config()
+    server, base_url = None, args.base_url
+    if base_url is None:
+        port = free_port()
+        server = mock_llm.start_in_thread(
+            config, os.path.dirname(CONFIG_PATH), host="127.0.0.1", port=port
+        )
+        base_url = f"http://127.0.0.1:{port}"
+
+    try:
+        baseline_rss = peak_rss_mb()
+        preprocessor, engines, ner = build_stages(config, base_url)
+        # Documents are generated up front so generation is not timed; arrays
+        # are BGR like decoded uploads
+        documents = []
+        for document in generate(args.count, args.seed, args.doc_types):
+            document["image"] = np.ascontiguousarray(
+                np.asarray(document["image"])[:, :, ::-1]
+            )
+            documents.append(document)
+
+        # One untimed document per doc_type warms each OCR profile's engine
+        warm_up = documents[: len(args.doc_types)]
+        asyncio.run(run(warm_up, preprocessor, engines, ner))
+        timings, recall = asyncio.run(run(documents, preprocessor, engines, ner))
+    finally:
+        if server is not None:
+            server.should_exit = True
+
+    report = {
+        "commit": git_commit(),
+        "config_digest": config_digest(config),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "seed": args.seed,
+        "documents": len(documents),
+        "doc_types": args.doc_types,
+        "ocr_backend": engines[args.doc_types[0]].backend,
+        "ocr_profiles": {
+            doc_type: profile
+            for doc_type, profile in resolve_profiles(
+                config["ocr"], config["doc_types"]
+            )[1].items()
+            if doc_type in args.doc_types
+        },
+        "llm": "mock" if server is not None else base_url,
+        "mock_llm": config.get("mock_llm") if server is not None else None,
+        "stages": {stage: summarize(timings[stage]) for stage in STAGES},
+        "docs_per_second": round(len(documents) / (sum(timings["total"]) / 1000), 3),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "peak_rss_over_baseline_mb": round(peak_rss_mb() - baseline_rss, 1),
+        "ocr_field_recall": round(recall["ocr"][0] / max(recall["ocr"][1], 1), 4),
+        "entity_accuracy": round(
+            recall["entities"][0] / max(recall["entities"][1], 1), 4
+        ),
+    }
+    output = json.dumps(report, indent=4)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
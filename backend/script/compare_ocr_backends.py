@@ -0,0 +1,181 @@
+"""
+Compare OCR inference backends on the same documents: latency, throughput and
+agreement of the recognised text with a reference backend.
+
+Documents are synthetic (see script.synthetic_documents) unless --input-dir
+points at images, optionally with the ground_truth.json that script writes.
+Backends that cannot run here are reported as unavailable. Run from the
+backend directory:
+    python -m script.compare_ocr_backends --count 24 --output backends.json
+    python -m script.compare_ocr_backends --backends paddle onnxruntime openvino
+"""
+
+import argparse
+import difflib
+import json
+import os
+import time
+
+import cv2
+import numpy as np
+
+from ocr_ner.src.ocr_backends import BACKENDS, OCRBackendUnavailable
+from ocr_ner.src.ocr_engine import OCREngine
+from ocr_ner.src.ocr_pool import worker_layout
+from ocr_ner.src.preprocessor import DocumentPreprocessor
+from script.benchmark_pipeline import (
+    config_digest,
+    git_commit,
+    load_config,
+    normalize,
+    summarize,
+)
+from script.synthetic_documents import generate
+
+
+def load_documents(args, preprocessor):
+    if args.input_dir:
+        manifest_path = os.path.join(args.input_dir, "ground_truth.json")
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+        else:
+            manifest = [
+                {"file": filename, "doc_type": None, "fields": {}}
+                for filename in sorted(os.listdir(args.input_dir))
+                if filename.lower().endswith((".png", ".jpg", ".jpeg"))
+            ]
+        documents = []
+        for entry in manifest[: args.count]:
+            image = cv2.imread(os.path.join(args.input_dir, entry["file"]))
+            documents.append({**entry, "image": image})
+    else:
+        documents = [
+            # Synthetic pages are PIL RGB; OCR gets BGR like decoded uploads
+            {
+                **document,
+                "image": np.ascontiguousarray(
+                    np.asarray(document["image"])[:, :, ::-1]
+                ),
+            }
+            for document in generate(args.count, args.seed)
+        ]
+    # Every backend OCRs the same preprocessed pages
+    for document in documents:
+        document["image"] = preprocessor.process(
+            document["image"], document["doc_type"]
+        )
+    return documents
+
+
+def run_backend(name, config, cpu_threads, documents):
+    ocr_config = config["ocr"]
+    backend = dict(ocr_config.get("backend") or {}, name=name, fallback=None)
+    start = time.perf_counter()
+    try:
+        engine = OCREngine(
+            dict(ocr_config["paddleocr_params"], cpu_threads=cpu_threads),
+            orientation=ocr_config.get("orientation"),
+            backend=backend,
+        )
+    except OCRBackendUnavailable as e:
+        return {"available": False, "error": str(e)}, None
+    load_ms = (time.perf_counter() - start) * 1000
+
+    # One untimed page compiles kernels and sizes the sessions
+    engine.extract_lines(documents[0]["image"])
+    latencies, texts = [], []
+    for document in documents:
+        start = time.perf_counter()
+        texts.append(engine.extract_lines(document["image"])["text"])
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    found = expected = 0
+    for document, text in zip(documents, texts):
+        for value in document["fields"].values():
+            if value:
+                expected += 1
+                found += normalize(value) in normalize(text)
+    report = {
+        "available": True,
+        "load_ms": round(load_ms, 1),
+        "latency": summarize(latencies),
+        "docs_per_second": round(len(documents) / (sum(latencies) / 1000), 3),
+        "field_recall": round(found / expected, 4) if expected else None,
+    }
+    return report, texts
+
+
+def agreement(texts, reference):
+    """Character similarity of each document's text to the reference's."""
+    ratios = [
+        difflib.SequenceMatcher(None, text, ref, autojunk=False).ratio()
+        for text, ref in zip(texts, reference)
+    ]
+    return {
+        "mean_similarity": round(float(np.mean(ratios)), 4),
+        "min_similarity": round(float(np.min(ratios)), 4),
+        "identical_documents": sum(text == ref for text, ref in zip(texts, reference)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--backends", nargs="+", default=BACKENDS, choices=BACKENDS)
+    parser.add_argument(
+        "--reference", default="paddle", help="Backend the text is compared against"
+    )
+    parser.add_argument("--input-dir", help="Images to use instead of synthetic ones")
+    parser.add_argument("--count", type=int, default=24)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--cpu-threads",
+        type=int,
+        help="Threads per engine; defaults to ocr.workers.cpu_threads, as deployed",
+    )
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    args = parser.parse_args()
+
+    config = load_config()
+    cpu_threads = args.cpu_threads or worker_layout(config["ocr"].get("workers", {}))[1]
+    preprocessor = DocumentPreprocessor(config=config.get("preprocessing"))
+    documents = load_documents(args, preprocessor)
+    if not documents:
+        raise SystemExit("No documents to OCR")
+
+    backends = list(dict.fromkeys([args.reference, *args.backends]))
+    reports, texts = {}, {}
+    for name in backends:
+        reports[name], texts[name] = run_backend(name, config, cpu_threads, documents)
+
+    reference = texts.get(args.reference)
+    for name, report in reports.items():
+        if reference is not None and texts[name] is not None:
+            report["agreement"] = agreement(texts[name], reference)
+            report["speedup"] = round(
+                reports[args.reference]["latency"]["mean_ms"]
+                / report["latency"]["mean_ms"],
+                2,
+            )
+
+    output = json.dumps(
+        {
+            "commit": git_commit(),
+            "config_digest": config_digest(config),
+            "cpu_count": os.cpu_count(),
+            "cpu_threads": cpu_threads,
+            "documents": len(documents),
+            "source": args.input_dir or f"synthetic (seed {args.seed})",
+            "reference": args.reference,
+            "backends": reports,
+        },
+        indent=4,
+    )
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Compare prompt tokens, NER latency and field accuracy with and without OCR
+text compaction over a fixture set.
+
+Each fixture is a JSON file with "doc_type", "ocr" ({"text", "lines"} as
+stored for a document) and the "expected" entities. Run from the backend
+directory against the configured LLM, or the mock for tokens and latency only:
+    python -m script.eval_compaction
+    python -m script.eval_compaction --base-url http://127.0.0.1:8089
+"""
+
+import argparse
+import asyncio
+import glob
+import json
+import os
+import re
+import time
+
+import yaml
+
+from ocr_ner.data_extractor import CONFIG_PATH
+from ocr_ner.src.ner_processor import NERProcessor
+from ocr_ner.src.text_compactor import estimate_tokens
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures", "ner")
+
+
+def normalize(value):
+    return re.sub(r"\s+", " ", str(value or "")).strip().casefold()
+
+
+def load_config(base_url=None, compaction=True):
+    with open(CONFIG_PATH) as f:
+        config = yaml.safe_load(f)
+    config_dir = os.path.dirname(CONFIG_PATH)
+    for doc_config in config["doc_types"].values():
+        doc_config["prompt"] = os.path.join(config_dir, doc_config["prompt"])
+    if base_url:
+        config["ner"]["base_url"] = base_url
+    config["ner"].setdefault("compaction", {})["enabled"] = compaction
+    return config
+
+
+async def evaluate(ner, fixtures):
+    totals = {"fields": 0, "correct": 0, "prompt_tokens": 0, "ms": 0.0, "errors": 0}
+    for fixture in fixtures:
+        doc_type, ocr = fixture["doc_type"], fixture["ocr"]
+        prompt_text = ner._prompt_text(ocr["text"], doc_type, ocr["lines"])
+        messages = ner._build_messages(prompt_text, doc_type)
+        totals["prompt_tokens"] += sum(
+            estimate_tokens(message["content"]) for message in messages
+        )
+
+        start = time.perf_counter()
+        entities = await ner.aextract_entities(ocr["text"], doc_type, ocr["lines"])
+        totals["ms"] += (time.perf_counter() - start) * 1000
+        if "error" in entities:
+            totals["errors"] += 1
+            entities = {}
+        for field, expected in fixture["expected"].items():
+            totals["fields"] += 1
+            totals["correct"] += normalize(entities.get(field)) == normalize(expected)
+
+    count = len(fixtures)
+    return {
+        "documents": count,
+        "mean_prompt_tokens": round(totals["prompt_tokens"] / count, 1),
+        "mean_ner_ms": round(totals["ms"] / count, 1),
+        "field_accuracy": round(totals["correct"] / max(totals["fields"], 1), 4),
+        "errors": totals["errors"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--fixtures", default=FIXTURES_DIR)
+    parser.add_argument("--base-url", help="LLM endpoint, e.g. the mock LLM server")
+    args = parser.parse_args()
+
+    fixtures = []
+    for path in sorted(glob.glob(os.path.join(args.fixtures, "*.json"))):
+        with open(path) as f:
+            fixtures.append(json.load(f))
+    if not fixtures:
+        raise SystemExit(f"No fixtures found in {args.fixtures}")
+
+    reports = {}
+    for mode, compaction in (("raw", False), ("compacted", True)):
+        config = load_config(args.base_url, compaction)
+        # Rules fill the same fields either way; only the LLM prompt differs
+        ner = NERProcessor(config)
+        reports[mode] = asyncio.run(evaluate(ner, fixtures))
+    print(json.dumps(reports, indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+Serve a local mock of the LLM chat-completions endpoint for offline runs.
+
+Run from the backend directory, then set ner.base_url in config.yaml to the
+printed URL:
+    python -m script.mock_llm_server --tokens-per-second 40 --ttft-ms 300
+"""
+
+import argparse
+import os
+
+import uvicorn
+import yaml
+
+from ocr_ner.data_extractor import CONFIG_PATH
+from ocr_ner.src.mock_llm import DEFAULT_SETTINGS, create_app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host")
+    parser.add_argument("--port", type=int)
+    parser.add_argument("--tokens-per-second", type=float)
+    parser.add_argument("--ttft-ms", type=float)
+    parser.add_argument("--prefill-tokens-per-second", type=float)
+    parser.add_argument("--error-rate", type=float)
+    parser.add_argument("--max-concurrent", type=int)
+    parser.add_argument("--trailing-tokens", type=int)
+    args = parser.parse_args()
+
+    with open(CONFIG_PATH) as f:
+        config = yaml.safe_load(f)
+
+    # Command-line flags override the mock_llm section of config.yaml
+    settings = {**DEFAULT_SETTINGS, **config.get("mock_llm", {})}
+    for name, value in vars(args).items():
+        if value is not None:
+            settings[name] = value
+    config["mock_llm"] = settings
+
+    print(f"Mock LLM at http://{settings['host']}:{settings['port']}")
+    uvicorn.run(
+        create_app(config, os.path.dirname(CONFIG_PATH)),
+        host=settings["host"],
+        port=settings["port"],
+    )
+
+
+if __name__ == "__main__":
+    main()
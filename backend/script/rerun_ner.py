@@ -0,0 +1,50 @@
+"""
+Re-run NER and post-processing over stored OCR text, without re-OCR.
+
+Run from the backend directory after editing prompts under ocr_ner/config/prompts:
+    python -m script.rerun_ner --doc-type school_mark
+    python -m script.rerun_ner --doc-id 12 --doc-id 15
+"""
+
+import argparse
+import asyncio
+
+from app.database import SessionLocal, engine
+from app.migrations import add_missing_columns
+from app.models import ApplicantDocuments
+from app.ner_rerun import rerun_documents_ner
+from ocr_ner import data_extractor
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--doc-type", help="Re-run every document of this doc_type")
+    group.add_argument("--doc-id", type=int, action="append", help="Document id")
+    args = parser.parse_args()
+
+    # Databases created before ocr_text existed get the column
+    add_missing_columns(engine)
+    db = SessionLocal()
+    try:
+        # Only the NER side: stored OCR text needs no OCR models or workers
+        data_extractor.load_ner()
+        query = db.query(ApplicantDocuments).filter(
+            ApplicantDocuments.ocr_text.isnot(None)
+        )
+        if args.doc_type:
+            query = query.filter(ApplicantDocuments.doc_type == args.doc_type)
+        else:
+            query = query.filter(ApplicantDocuments.id.in_(args.doc_id))
+
+        documents = query.order_by(ApplicantDocuments.id).all()
+        # LLM calls overlap up to the ner.concurrency limits in config.yaml
+        done, failed = asyncio.run(rerun_documents_ner(documents, db))
+        print(f"Re-ran NER for {done} documents ({failed} failed)")
+    finally:
+        db.close()
+        data_extractor.shutdown()
+
+
+if __name__ == "__main__":
+    main()
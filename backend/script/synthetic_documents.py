@@ -0,0 +1,231 @@
+"""
+Generate synthetic certificate and Aadhaar-like document images with known
+field values, for benchmarks.
+
+Documents are fully determined by the seed, so runs on different commits
+see the same pages. Run from the backend directory to write them to disk:
+    python -m script.synthetic_documents --output-dir data/synthetic --count 24
+"""
+
+import argparse
+import json
+import os
+import random
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+from ocr_ner.src.rule_extractor import verhoeff_valid
+
+# Variations cycled through by the generated documents
+WIDTHS = [900, 1600, 2400]
+NOISE_SIGMAS = [0, 6, 18]
+ROTATIONS = [0, 2, 90, 180]
+DOC_TYPES = ["aadhaar", "school_cert", "school_mark"]
+
+# Pages are laid out at this width, then scaled to the document's width
+LAYOUT_WIDTH = 1200
+
+FIRST_NAMES = ["Rahul", "Priya", "Amit", "Sunita", "Vikas", "Neha", "Arjun", "Pooja"]
+LAST_NAMES = ["Kumar", "Sharma", "Singh", "Verma", "Yadav", "Gupta", "Paswan", "Das"]
+CITIES = ["Patna", "Lucknow", "Ranchi", "Gaya", "Varanasi", "Bhopal"]
+STATES = {
+    "Patna": "Bihar",
+    "Gaya": "Bihar",
+    "Lucknow": "Uttar Pradesh",
+    "Varanasi": "Uttar Pradesh",
+    "Ranchi": "Jharkhand",
+    "Bhopal": "Madhya Pradesh",
+}
+BOARDS = [
+    "BIHAR SCHOOL EXAMINATION BOARD",
+    "CENTRAL BOARD OF SECONDARY EDUCATION",
+    "BOARD OF HIGH SCHOOL AND INTERMEDIATE EDUCATION",
+]
+DIVISIONS = ["first division", "second division", "third division"]
+SUBJECTS = ["ENGLISH", "HINDI", "MATHEMATICS", "SCIENCE", "SOCIAL SCIENCE"]
+
+
+def _font(size):
+    try:
+        return ImageFont.truetype("DejaVuSans.ttf", size)
+    except OSError:
+        return ImageFont.load_default(size=size)
+
+
+def _name(rng):
+    return f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+
+
+def _aadhaar_number(rng):
+    while True:
+        number = str(rng.randint(2, 9)) + "".join(
+            str(rng.randint(0, 9)) for _ in range(11)
+        )
+        if verhoeff_valid(number):
+            return f"{number[:4]} {number[4:8]} {number[8:]}"
+
+
+def _aadhaar(rng):
+    name = _name(rng)
+    father = f"{rng.choice(FIRST_NAMES)} {name.split()[1]}"
+    city = rng.choice(CITIES)
+    address = f"{rng.randint(1, 200)} Gandhi Nagar, {city}, {STATES[city]}"
+    fields = {
+        "name": name,
+        "gender": rng.choice(["Male", "Female"]),
+        "dob": f"{rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/"
+        f"{rng.randint(1980, 2006)}",
+        "aadhaarno": _aadhaar_number(rng),
+        "fathername": father,
+        "address": address,
+    }
+    lines = [
+        ("GOVERNMENT OF INDIA", 44, True),
+        (fields["name"], 34, False),
+        (f"DOB: {fields['dob']}", 30, False),
+        (fields["gender"].upper(), 30, False),
+        (f"S/O: {father}, {address}", 24, False),
+        (fields["aadhaarno"], 52, True),
+        ("Aadhaar - Aam Aadmi ka Adhikar", 26, True),
+    ]
+    return fields, lines, 760
+
+
+def _school(rng, marksheet):
+    name = _name(rng)
+    surname = name.split()[1]
+    passout = str(rng.randint(2005, 2023))
+    fields = {
+        "name": name,
+        "exam_name": "Secondary School Examination",
+        "board": rng.choice(BOARDS),
+        "father_name": f"{rng.choice(FIRST_NAMES)} {surname}",
+        "mother_name": f"{rng.choice(FIRST_NAMES)} Devi",
+        "roll_number": str(rng.randint(1000000, 9999999)),
+        "school": f"{rng.choice(LAST_NAMES).upper()} HIGH SCHOOL, "
+        f"{rng.choice(CITIES).upper()}",
+        "division": rng.choice(DIVISIONS),
+        "passout": passout,
+    }
+    lines = [
+        (fields["board"], 36, True),
+        ("MARKS STATEMENT" if marksheet else "SECONDARY SCHOOL CERTIFICATE", 32, True),
+        (f"{fields['exam_name']} held in {passout}", 28, True),
+        ("This is to certify that", 26, False),
+        (fields["name"].upper(), 34, True),
+        (f"Son/Daughter of {fields['father_name']}", 26, False),
+        (f"and {fields['mother_name']}", 26, False),
+        (f"Roll No. {fields['roll_number']}", 28, False),
+        (f"of {fields['school']}", 26, False),
+    ]
+    if marksheet:
+        del fields["father_name"], fields["mother_name"]
+        fields["stream"] = ""
+        lines.append(("SUBJECT   THEORY   PRACTICAL   TOTAL", 26, False))
+        for subject in SUBJECTS:
+            theory = rng.randint(40, 80)
+            practical = rng.randint(10, 20)
+            lines.append(
+                (
+                    f"{subject}   {theory}   {practical}   {theory + practical}",
+                    24,
+                    False,
+                )
+            )
+    lines.append((f"and placed in {fields['division'].upper()}", 28, False))
+    return fields, lines, 1500 if marksheet else 1100
+
+
+def render(lines, height):
+    """Draw text lines onto a white page of LAYOUT_WIDTH x height."""
+    page = Image.new("RGB", (LAYOUT_WIDTH, height), "white")
+    draw = ImageDraw.Draw(page)
+    draw.rectangle([20, 20, LAYOUT_WIDTH - 20, height - 20], outline="black", width=4)
+    y = 70
+    for text, size, centered in lines:
+        font = _font(size)
+        width = draw.textlength(text, font=font)
+        x = (LAYOUT_WIDTH - width) / 2 if centered else 80
+        draw.text((x, y), text, fill="black", font=font)
+        y += int(size * 1.8)
+    return page
+
+
+def degrade(page, width, noise_sigma, rotation, rng):
+    """Scale, rotate and add Gaussian noise like a phone photo or a poor scan."""
+    scale = width / page.width
+    page = page.resize((width, int(page.height * scale)), Image.Resampling.LANCZOS)
+    if rotation:
+        page = page.rotate(-rotation, expand=True, fillcolor="white")
+    img = np.asarray(page, dtype=np.float32)
+    if noise_sigma:
+        noise = np.random.default_rng(rng.randint(0, 2**32 - 1)).normal(
+            0, noise_sigma, img.shape
+        )
+        img = img + noise
+    return Image.fromarray(np.clip(img, 0, 255).astype(np.uint8))
+
+
+def generate(count, seed=0, doc_types=None):
+    """
+    Yield synthetic documents, cycling through doc_types, widths, noise levels
+    and rotations.
+
+    Yields:
+        dict: "doc_type", "image" (PIL image), "fields" (ground truth) and
+        "variant" ({"width", "noise_sigma", "rotation"}).
+    """
+    rng = random.Random(seed)
+    doc_types = doc_types or DOC_TYPES
+    for i in range(count):
+        doc_type = doc_types[i % len(doc_types)]
+        # Strides chosen so every doc_type meets every width, noise and rotation
+        block = len(doc_types)
+        variant = {
+            "width": WIDTHS[(i // block) % len(WIDTHS)],
+            "noise_sigma": NOISE_SIGMAS[
+                (i // (block * len(WIDTHS))) % len(NOISE_SIGMAS)
+            ],
+            "rotation": ROTATIONS[i % len(ROTATIONS)],
+        }
+        if doc_type == "aadhaar":
+            fields, lines, height = _aadhaar(rng)
+        else:
+            fields, lines, height = _school(rng, marksheet=doc_type == "school_mark")
+        image = degrade(render(lines, height), rng=rng, **variant)
+        yield {
+            "doc_type": doc_type,
+            "image": image,
+            "fields": fields,
+            "variant": variant,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--output-dir", required=True)
+    parser.add_argument("--count", type=int, default=24)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    manifest = []
+    for i, document in enumerate(generate(args.count, args.seed)):
+        filename = f"{i:04d}_{document['doc_type']}.png"
+        document["image"].save(os.path.join(args.output_dir, filename))
+        manifest.append(
+            {
+                "file": filename,
+                "doc_type": document["doc_type"],
+                "fields": document["fields"],
+                "variant": document["variant"],
+            }
+        )
+    with open(os.path.join(args.output_dir, "ground_truth.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    print(f"Wrote {len(manifest)} documents to {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
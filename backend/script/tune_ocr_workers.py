@@ -0,0 +1,162 @@
+"""
+Find the OCR worker layout (processes x threads per process) with the best
+throughput on this host.
+
+Each layout that keeps at least half of the available cores busy without
+oversubscribing them OCRs the same preprocessed pages through OCRWorkerPool,
+as the API does. --write stores the fastest in config.yaml (ocr.workers).
+Run from the backend directory on the node being tuned:
+    python -m script.tune_ocr_workers --count 24
+    python -m script.tune_ocr_workers --write --pin-cores
+"""
+
+import argparse
+import json
+import time
+from concurrent.futures import wait
+
+from ocr_ner.data_extractor import CONFIG_PATH
+from ocr_ner.src.ocr_pool import OCRWorkerPool, available_cores
+from ocr_ner.src.preprocessor import DocumentPreprocessor
+from script.benchmark_pipeline import config_digest, git_commit, load_config
+from script.compare_ocr_backends import load_documents
+
+
+def candidate_layouts(cores, workers=None, threads=None):
+    """Layouts to try; explicitly requested counts are all tried."""
+    explicit = bool(workers or threads)
+    threads = threads or [t for t in (1, 2, 4, 8, 16) if t <= cores]
+    layouts = []
+    for t in threads:
+        counts = workers or range(1, cores // t + 1)
+        layouts.extend(
+            (count, t)
+            for count in counts
+            if explicit or cores // 2 <= count * t <= cores
+        )
+    return layouts or [(1, 1)]
+
+
+def measure(config, layout, documents, pin_cores):
+    count, cpu_threads = layout
+    ocr_config = config["ocr"]
+    pool = OCRWorkerPool(
+        ocr_config["paddleocr_params"],
+        workers=count,
+        cpu_threads=cpu_threads,
+        orientation=ocr_config.get("orientation"),
+        backend=ocr_config.get("backend"),
+        pin_cores=pin_cores,
+    )
+    try:
+        # Model loading is not timed
+        pool.warm_up()
+        start = time.perf_counter()
+        futures = [pool.submit(document["image"]) for document in documents]
+        wait(futures)
+        elapsed = time.perf_counter() - start
+        for future in futures:
+            future.result()
+    finally:
+        pool.executor.shutdown(wait=True, cancel_futures=True)
+    return {
+        "workers": count,
+        "cpu_threads": cpu_threads,
+        "docs_per_second": round(len(documents) / elapsed, 3),
+        # Time one worker spends per document at full load
+        "ms_per_document": round(elapsed * 1000 * count / len(documents), 1),
+    }
+
+
+def write_layout(path, values):
+    """
+    Set keys of the ocr.workers block in place, keeping the file's comments
+    and layout (a YAML dump would drop them).
+    """
+    with open(path) as f:
+        lines = f.readlines()
+    try:
+        start = lines.index("  workers:\n")
+    except ValueError:
+        raise SystemExit(f"No ocr.workers block in {path}")
+
+    values = dict(values)
+    end = start + 1
+    for i in range(start + 1, len(lines)):
+        line = lines[i]
+        if line.strip() and not line.startswith("    "):
+            break
+        key = line.strip().split(":", 1)[0]
+        if key in values:
+            lines[i] = f"    {key}: {values.pop(key)}\n"
+        if line.strip():
+            end = i + 1
+    # Keys the block did not have yet go at its end
+    lines[end:end] = [f"    {key}: {value}\n" for key, value in values.items()]
+    with open(path, "w") as f:
+        f.writelines(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--input-dir", help="Images to use instead of synthetic ones")
+    parser.add_argument("--count", type=int, default=24)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, nargs="+", help="Process counts to try")
+    parser.add_argument("--threads", type=int, nargs="+", help="Threads to try")
+    parser.add_argument(
+        "--pin-cores", action="store_true", help="Pin each worker to its own cores"
+    )
+    parser.add_argument(
+        "--write", action="store_true", help="Store the best layout in config.yaml"
+    )
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    args = parser.parse_args()
+
+    config = load_config()
+    cores = len(available_cores())
+    preprocessor = DocumentPreprocessor(config=config.get("preprocessing"))
+    documents = load_documents(args, preprocessor)
+    if not documents:
+        raise SystemExit("No documents to OCR")
+
+    results = []
+    for layout in candidate_layouts(cores, args.workers, args.threads):
+        result = measure(config, layout, documents, args.pin_cores)
+        print(json.dumps(result))
+        results.append(result)
+    best = max(results, key=lambda result: result["docs_per_second"])
+
+    output = json.dumps(
+        {
+            "commit": git_commit(),
+            "config_digest": config_digest(config),
+            "cores": cores,
+            "documents": len(documents),
+            "pin_cores": args.pin_cores,
+            "layouts": results,
+            "best": best,
+        },
+        indent=4,
+    )
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    if args.write:
+        write_layout(
+            CONFIG_PATH,
+            {
+                "count": best["workers"],
+                "cpu_threads": best["cpu_threads"],
+                "pin_cores": str(args.pin_cores).lower(),
+            },
+        )
+        print(
+            f"Wrote {best['workers']} workers x {best['cpu_threads']} threads "
+            f"to {CONFIG_PATH}"
+        )
+
+
+if __name__ == "__main__":
+    main()
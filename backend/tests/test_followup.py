@@ -0,0 +1,42 @@
+"""
+Follow-up prompts keep what the first answer got right, whatever shape
+either answer has. Run from the backend directory:
+    python -m pytest tests
+"""
+
+import copy
+import os
+
+import pytest
+import yaml
+
+from ocr_ner.src.ner_processor import NERProcessor
+
+CONFIG_DIR = os.path.join(os.path.dirname(__file__), "..", "ocr_ner", "config")
+with open(os.path.join(CONFIG_DIR, "config.yaml")) as f:
+    CONFIG = yaml.safe_load(f)
+
+
+@pytest.fixture(scope="module")
+def ner():
+    config = copy.deepcopy(CONFIG)
+    for doc_config in config["doc_types"].values():
+        doc_config["prompt"] = os.path.join(CONFIG_DIR, doc_config["prompt"])
+    return NERProcessor(config)
+
+
+def test_answer_that_is_not_an_object_keeps_entities(ner):
+    entities = {"name": "Ravi Kumar", "passout": "n.a."}
+    fields = {"passout": "invalid"}
+    assert ner._apply_followup(entities, ["2019"], fields, "uni_cert") == entities
+
+
+def test_entities_that_are_not_an_object_are_all_followed_up(ner):
+    entities = [{"name": "Ravi Kumar"}]
+    fields = ner._followup_fields(entities, "uni_cert", {})
+    assert list(fields) == CONFIG["doc_types"]["uni_cert"]["fields"]
+
+    answers = {"name": "Ravi Kumar", "passout": "2019"}
+    result = ner._apply_followup(entities, answers, fields, "uni_cert")
+    assert result["passout"] == "2019"
+    assert result["college"] is None
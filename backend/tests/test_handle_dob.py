@@ -0,0 +1,28 @@
+"""
+Dates of birth are stored as dd-mm-yyyy. Run from the backend directory:
+    python -m pytest tests
+"""
+
+import pytest
+
+from post_processing.tasks.handle_dob import parse_date
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        ("12/05/2001", "12-05-2001"),
+        ("2001-05-12", "12-05-2001"),
+        ("23-Feb-1993", "23-02-1993"),
+        # Dotted, as on many certificates and Aadhaar prints
+        ("12.05.2001", "12-05-2001"),
+        ("12. 05. 2001", "12-05-2001"),
+        ("12.05.01", "12-05-2001"),
+    ],
+)
+def test_parse_date(value, expected):
+    assert parse_date(value) == expected
+
+
+def test_unparseable_date_is_kept():
+    assert parse_date("sometime in May") == "sometime in May"
@@ -0,0 +1,83 @@
+"""
+Each doc_type's prompt must ask the LLM for exactly its configured fields:
+answers are checked, followed up and stored under those keys.
+Run from the backend directory:
+    python -m pytest tests
+"""
+
+import copy
+import json
+import os
+import re
+
+import pytest
+import yaml
+
+from ocr_ner.src.ner_processor import NERProcessor
+from ocr_ner.src.rule_extractor import verhoeff_valid
+
+CONFIG_DIR = os.path.join(os.path.dirname(__file__), "..", "ocr_ner", "config")
+with open(os.path.join(CONFIG_DIR, "config.yaml")) as f:
+    CONFIG = yaml.safe_load(f)
+
+# Values of the right format for fields that have one
+AADHAARNO = next(
+    number
+    for number in (f"23456789012{digit}" for digit in range(10))
+    if verhoeff_valid(number)
+)
+VALUES = {
+    "aadhaarno": AADHAARNO,
+    "dob": "12/05/2001",
+    "gender": "Male",
+    "roll_number": "1234567",
+    "passout": "2019",
+}
+
+
+def prompt_keys(path):
+    """The keys the prompt tells the LLM to answer with."""
+    with open(path) as f:
+        match = re.search(r"JSON format with keys: (.+)\.\s*$", f.read(), re.M)
+    assert match, f"{path} does not list its JSON keys"
+    return json.loads(f"[{match.group(1)}]")
+
+
+@pytest.fixture(scope="module")
+def ner():
+    config = copy.deepcopy(CONFIG)
+    for doc_config in config["doc_types"].values():
+        doc_config["prompt"] = os.path.join(CONFIG_DIR, doc_config["prompt"])
+    return NERProcessor(config)
+
+
+@pytest.mark.parametrize("doc_type", sorted(CONFIG["doc_types"]))
+def test_prompt_asks_for_configured_fields(ner, doc_type):
+    doc_config = CONFIG["doc_types"][doc_type]
+    keys = prompt_keys(os.path.join(CONFIG_DIR, doc_config["prompt"]))
+    assert keys == doc_config["fields"]
+
+    # A complete answer keyed as the prompt asks needs no follow-up
+    answer = {key: VALUES.get(key, "x") for key in keys}
+    assert ner.incomplete_fields(answer, doc_type) == {}
+    assert ner._followup_fields(answer, doc_type, {}) == {}
+
+
+@pytest.mark.parametrize(
+    "field, value",
+    [
+        ("dob", "2001-05-12"),
+        ("dob", "12.05.2001"),
+        ("dob", "23-Feb-2001"),
+        # Year of birth only, as some Aadhaar QR codes carry
+        ("dob", "2001"),
+        ("passout", "March 2019"),
+    ],
+)
+def test_post_processed_formats_are_valid(ner, field, value):
+    assert ner.field_problem(field, value) is None
+
+
+@pytest.mark.parametrize("field, value", [("dob", "31-02-2001"), ("passout", "n.a.")])
+def test_impossible_values_are_invalid(ner, field, value):
+    assert ner.field_problem(field, value) == "invalid"